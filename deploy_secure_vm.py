@@ -1,22 +1,221 @@
 #!/usr/bin/env python3
-import argparse, os, sys, time, re
+import argparse, atexit, hashlib, os, sys, time, re, json, threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass, field
 from datetime import datetime
-from openstack import connection
-from openstack.exceptions import ResourceNotFound
+from types import SimpleNamespace
+
+# L'SDK (openstack.*) è importato solo dove serve: caricarlo costa più di tutto
+# il resto dell'avvio, anche per --help o quando il token arriva dalla cache.
 
 def log(msg, kind="*"):
     print(f"[{kind}] {msg}")
 
-def wait_server_active(conn, server_id, timeout=600, poll=3):
-    start = time.time()
-    while time.time() - start < timeout:
-        s = conn.compute.get_server(server_id)
-        if s.status == "ACTIVE":
-            return s
-        if s.status in ("ERROR","DELETED"):
-            raise RuntimeError(f"VM status={s.status}")
-        time.sleep(poll)
-    raise TimeoutError("Timeout in attesa di ACTIVE")
+_NOT_FOUND = None
+
+def _sdk_not_found():
+    """ResourceNotFound dell'SDK, risolta una volta sola. Senza openstacksdk (cloud finto) è LookupError."""
+    global _NOT_FOUND
+    if _NOT_FOUND is None:
+        try:
+            from openstack.exceptions import ResourceNotFound as exc
+        except ImportError:
+            exc = LookupError
+        _NOT_FOUND = exc
+    return _NOT_FOUND
+
+# ------------------------
+# Attese condivise (server, port, immagini)
+# ------------------------
+class Waiter:
+    """Attende molte risorse insieme con query filtrate per tipo a ogni giro.
+
+    Più thread (es. cloni che fanno boot in parallelo) chiamano wait() sullo stesso
+    Waiter: chi arriva per primo all'istante di controllo interroga l'API per
+    tutte le risorse osservate di quel tipo, gli altri riusano il risultato se è
+    più recente di `min_poll`. L'intervallo è adattivo: con uno storico dei tempi
+    di pronto si avvicina dimezzando al tempo atteso, poi (o senza storico)
+    cresce da `min_poll` a `max_poll` con backoff esponenziale.
+    """
+    KINDS = ("server", "port", "image")
+
+    def __init__(self, conn, clock=time, min_poll=0.5, max_poll=3.0, backoff=1.5, max_calls=300):
+        self.conn = conn
+        self.clock = clock
+        self.min_poll = min_poll
+        self.max_poll = max_poll
+        self.backoff = backoff
+        self.max_calls = max_calls
+        self.lock = threading.Lock()
+        self.cond = threading.Condition(self.lock)
+        self.fetching = {k: False for k in self.KINDS}  # tipo -> query in volo
+        self.watched = {k: {} for k in self.KINDS}      # tipo -> {chiave: numero di attese}
+        self.seen = {k: {} for k in self.KINDS}         # tipo -> {chiave: risorsa | None}
+        self.polled_at = {k: None for k in self.KINDS}
+        self.server_mark = None                         # max updated_at visto (changes-since dei server)
+        self.calls = 0                                  # query totali fatte da questo Waiter
+        self.ready_times = {}                           # etichetta dell'attesa -> ultimi tempi di pronto
+
+    def expected(self, label):
+        """Tempo di pronto tipico (mediana delle ultime attese riuscite) o None."""
+        ts = sorted(self.ready_times.get(label, ()))
+        return ts[len(ts) // 2] if ts else None
+
+    def _delay(self, label, elapsed, n):
+        exp = self.expected(label)
+        if exp is not None and elapsed < exp:
+            # lontano dal tempo atteso si può dormire di più (fino a 10 x max_poll)
+            return min(10 * self.max_poll, max(self.min_poll, (exp - elapsed) / 2))
+        return min(self.max_poll, max(self.min_poll, self.min_poll * self.backoff ** n))
+
+    def _fetch(self, kind, keys, prev):
+        """{chiave: risorsa} per le chiavi osservate (assenti = non trovate).
+
+        Solo query filtrate: porte per lista di device_id, immagini per `id=in:...`,
+        server con GET per id alla prima volta e poi changes-since dall'ultimo
+        updated_at visto (`prev` = risultato precedente, per i server non cambiati).
+        """
+        c = self.conn
+        if kind == "server":
+            out = {k: prev[k] for k in keys if k in prev}
+            new = [k for k in keys if k not in prev]
+            if len(keys) > len(new):
+                changed = c.compute.servers(details=True, changes_since=self.server_mark) \
+                    if self.server_mark else ()
+                for s in changed:
+                    if s.id in keys:
+                        out[s.id] = None if getattr(s, "status", "").upper() in ("DELETED", "SOFT_DELETED") else s
+                    upd = getattr(s, "updated_at", None)
+                    if upd and upd > self.server_mark:
+                        self.server_mark = upd
+            got = []
+            for k in new:
+                try:
+                    out[k] = c.compute.get_server(k)
+                    got.append(getattr(out[k], "updated_at", None))
+                except _sdk_not_found():
+                    out.pop(k, None)
+            if self.server_mark is None and all(got) and got:
+                # primo giro: i cambiamenti successivi hanno updated_at >= del più vecchio letto
+                self.server_mark = min(got)
+            return {k: v for k, v in out.items() if v is not None}
+        if kind == "port":      # chiave = device_id della VM
+            out = {}
+            for p in c.network.ports(device_id=sorted(keys)):
+                if p.device_id in keys:
+                    out.setdefault(p.device_id, p)
+            return out
+        if kind == "image":
+            if len(keys) == 1:
+                (k,) = keys
+                try:
+                    return {k: c.image.get_image(k)}
+                except _sdk_not_found():
+                    return {}
+            return {im.id: im for im in c.image.images(id="in:" + ",".join(sorted(keys))) if im.id in keys}
+        raise ValueError(kind)
+
+    def _refresh(self, kind):
+        """Aggiorna lo snapshot del tipo se è più vecchio di min_poll (o non copre tutte le
+        chiavi osservate); True se ha fatto la query.
+
+        La query gira fuori dal lock: per ogni tipo ce n'è al massimo una in volo, chi
+        arriva nel frattempo aspetta quel risultato invece di rifarla.
+        """
+        with self.cond:
+            while True:
+                now = self.clock.time()
+                keys = set(self.watched[kind])
+                fresh = self.polled_at[kind] is not None and now - self.polled_at[kind] < self.min_poll
+                if fresh and keys <= set(self.seen[kind]):
+                    return False
+                if not self.fetching[kind]:
+                    break
+                self.cond.wait()
+            self.fetching[kind] = True
+            prev = dict(self.seen[kind])
+        try:
+            found = self._fetch(kind, keys, prev)
+        finally:
+            with self.cond:
+                self.fetching[kind] = False
+                self.cond.notify_all()
+        with self.lock:
+            self.calls += 1
+            # le chiavi non più osservate durante la query restano fuori
+            self.seen[kind] = {k: found.get(k) for k in keys if k in self.watched[kind]}
+            self.polled_at[kind] = self.clock.time()
+            return True
+
+    def wait_all(self, kind, keys, ready, failed=None, timeout=600, max_calls=None, what=None):
+        """Attende che ready(risorsa) sia vero per tutte le chiavi; la risorsa è None se non trovata.
+
+        failed(risorsa) -> messaggio (o None) interrompe l'attesa con RuntimeError.
+        Ritorna ({chiave: (risorsa, secondi)}, chiavi ancora in attesa allo scadere
+        del timeout o del budget di `max_calls` query).
+        """
+        max_calls = self.max_calls if max_calls is None else max_calls
+        label = what or kind
+        times = self.ready_times.setdefault(label, deque(maxlen=20))
+        start = self.clock.time()
+        pending = set(keys)
+        done = {}
+        with self.lock:
+            for k in pending:
+                self.watched[kind][k] = self.watched[kind].get(k, 0) + 1
+        calls = n = 0
+        try:
+            while pending:
+                if self._refresh(kind):
+                    calls += 1
+                with self.lock:
+                    snap = {k: self.seen[kind].get(k) for k in pending}
+                now = self.clock.time()
+                for k, res in snap.items():
+                    msg = failed(res) if failed else None
+                    if msg:
+                        raise RuntimeError(f"{label} {k}: {msg}")
+                    if ready(res):
+                        done[k] = (res, now - start)
+                        times.append(now - start)
+                        pending.discard(k)
+                elapsed = now - start
+                if not pending or elapsed >= timeout or calls >= max_calls:
+                    break
+                exp = self.expected(label)
+                if exp is None or elapsed >= exp:
+                    n += 1
+                self.clock.sleep(min(self._delay(label, elapsed, n), max(0.0, timeout - elapsed)))
+        finally:
+            with self.lock:
+                for k in keys:
+                    left = self.watched[kind].get(k, 0) - 1
+                    if left > 0:
+                        self.watched[kind][k] = left
+                    else:
+                        self.watched[kind].pop(k, None); self.seen[kind].pop(k, None)
+        if pending and calls >= max_calls:
+            log(f"Attesa {label}: budget di {max_calls} query esaurito","!")
+        return done, pending
+
+    def wait(self, kind, key, ready, failed=None, timeout=600, max_calls=None, what=None):
+        """Come wait_all per una sola risorsa: ritorna la risorsa pronta, TimeoutError altrimenti."""
+        done, pending = self.wait_all(kind, [key], ready, failed, timeout, max_calls, what)
+        if pending:
+            raise TimeoutError(f"Timeout in attesa di {what or kind} {key}")
+        res, took = done[key]
+        log(f"{what or kind} pronto in {took:.1f}s","i")
+        return res
+
+def wait_server_active(conn, server_id, timeout=600, poll=3, clock=time, waiter=None):
+    """Attende ACTIVE (`poll` = intervallo massimo tra due controlli se non si passa un Waiter)."""
+    waiter = waiter or Waiter(conn, clock=clock, max_poll=poll)
+    return waiter.wait("server", server_id, ready=lambda s: s is not None and s.status == "ACTIVE",
+                       failed=lambda s: "VM status=DELETED" if s is None else
+                       (f"VM status={s.status}" if s.status in ("ERROR", "DELETED") else None),
+                       timeout=timeout, what="VM")
 
 def ensure_keypair(conn, keypair_name, pubkey_file=None):
     try:
@@ -116,17 +315,143 @@ def pick_flavor(conn, name="m1.tiny"):
 
 
 
-def ensure_fip(conn, server, network_name="external", wait_secs=120):
-    """Associa un floating IP alla VM usando Neutron (robusto)."""
-    import time
-    from openstack.exceptions import ResourceNotFound
+# ------------------------
+# Pool di Floating IP pre-allocati
+# ------------------------
+FIP_POOL_TAG = "autoscale-fip-pool"     # description dei FIP liberi del pool (cleanup non li tocca)
 
-    # 1) Attendi che la VM sia ACTIVE
-    try:
-        server = conn.compute.wait_for_server(server, status="ACTIVE", failures=["ERROR"], wait=wait_secs, interval=3)
-    except Exception:
-        # fallback: almeno rifetch
-        server = conn.compute.get_server(server.id)
+class FipPool:
+    """Floating IP già allocati e liberi, riforniti da un thread in background.
+
+    `take()` restituisce subito un FIP del pool (allocandone uno solo se il pool
+    è vuoto): niente scan di tutti i FIP del tenant a ogni clone. I FIP liberi
+    sono marcati con description=FIP_POOL_TAG, così sopravvivono a `cleanup()`
+    e vengono riadottati al riavvio; all'associazione la description si azzera.
+    """
+
+    def __init__(self, conn, size=2, network_name="external", tag=FIP_POOL_TAG):
+        self.conn = conn
+        self.size = size
+        self.tag = tag
+        self.net = conn.network.find_network(network_name, ignore_missing=False)
+        self.free = deque()
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.stopping = threading.Event()
+        self.thread = None
+        self.attach_times = deque(maxlen=50)    # secondi da ACTIVE a FIP associato
+        self.on_attach = None                   # callback(secondi), es. metriche dell'autoscaler
+        self.hits = self.misses = 0
+
+    def adopt(self):
+        """Riprende i FIP del pool rimasti liberi (es. da un'esecuzione precedente)."""
+        with self.lock:
+            known = {f.id for f in self.free}
+            for f in self.conn.network.ips(floating_network_id=self.net.id, status="DOWN"):
+                if getattr(f, "description", "") == self.tag and not f.port_id and f.id not in known:
+                    self.free.append(f)
+            return len(self.free)
+
+    def _allocate(self):
+        return self.conn.network.create_ip(floating_network_id=self.net.id, description=self.tag)
+
+    def fill(self):
+        while not self.stopping.is_set():
+            with self.lock:
+                if len(self.free) >= self.size:
+                    return
+            f = self._allocate()
+            with self.lock:
+                self.free.append(f)
+            log(f"FIP pool: pre-allocato {f.floating_ip_address} ({len(self.free)}/{self.size})","i")
+
+    def start(self):
+        n = self.adopt()
+        if n:
+            log(f"FIP pool: {n} FIP liberi riadottati","i")
+        self.thread = threading.Thread(target=self._run, name="fip-pool", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopping.set(); self.wake.set()
+
+    def _run(self):
+        while not self.stopping.is_set():
+            try:
+                self.fill()
+            except Exception as e:
+                log(f"FIP pool: refill fallito: {e}","!")
+                self.stopping.wait(10)
+                continue
+            self.wake.wait(30); self.wake.clear()
+
+    def take(self):
+        with self.lock:
+            f = self.free.popleft() if self.free else None
+        self.wake.set()
+        if f is not None:
+            self.hits += 1
+            return f
+        self.misses += 1
+        log("FIP pool vuoto: alloco un FIP on demand","i")
+        return self._allocate()
+
+    def put_back(self, fip):
+        """Restituisce al pool un FIP preso ma non associato."""
+        with self.lock:
+            self.free.append(fip)
+
+    def record(self, seconds):
+        self.attach_times.append(seconds)
+        if self.on_attach:
+            self.on_attach(seconds)
+
+def release_fip_pool(conn, tag=FIP_POOL_TAG):
+    """Rilascia i FIP liberi del pool (non associati); ritorna gli indirizzi rimossi."""
+    out = []
+    for f in conn.network.ips(status="DOWN"):
+        if getattr(f, "description", "") == tag and not f.port_id:
+            conn.network.delete_ip(f.id, ignore_missing=True)
+            out.append(f.floating_ip_address)
+    return out
+
+# FIP liberi già scelti da un boot in corso in questo processo: due create concorrenti
+# (ActionTracker, --step-up) non devono associare lo stesso FIP
+_FIP_LOCK = threading.Lock()
+_FIP_CLAIMS = set()
+
+def _claim_free_fip(conn, net):
+    """Prenota un FIP libero (non del FipPool, non prenotato da un altro boot) o ne crea uno nuovo."""
+    with _FIP_LOCK:
+        for f in conn.network.ips(floating_network_id=net.id):
+            if not f.port_id and f.id not in _FIP_CLAIMS and getattr(f, "description", "") != FIP_POOL_TAG:
+                _FIP_CLAIMS.add(f.id)
+                return f
+    f = conn.network.create_ip(floating_network_id=net.id)
+    with _FIP_LOCK:
+        _FIP_CLAIMS.add(f.id)
+    return f
+
+def _release_fip_claims(*fips):
+    with _FIP_LOCK:
+        _FIP_CLAIMS.difference_update(f.id for f in fips)
+
+def ensure_fip(conn, server, network_name="external", wait_secs=120, clock=time, pool=None, waiter=None):
+    """Associa un floating IP alla VM usando Neutron (robusto).
+
+    Con `pool` il FIP arriva dal FipPool; il port è atteso con il Waiter condiviso.
+    """
+    t0 = clock.time()
+    waiter = waiter or Waiter(conn, clock=clock)
+
+    # 1) Attendi che la VM sia ACTIVE (di solito lo è già: niente chiamate)
+    if getattr(server, "status", None) != "ACTIVE":
+        try:
+            server = wait_server_active(conn, server.id, timeout=wait_secs, clock=clock, waiter=waiter)
+        except Exception:
+            # fallback: almeno rifetch
+            server = conn.compute.get_server(server.id)
 
     # 2) Se ha già un FIP, restituiscilo
     try:
@@ -141,132 +466,436 @@ def ensure_fip(conn, server, network_name="external", wait_secs=120):
         pass
 
 
-    # 3) Trova/crea un FIP libero
-    # risolviamo la rete esterna -> net.id
-    net = conn.network.find_network(network_name, ignore_missing=False)
-    fip = None
-    for f in conn.network.ips():
-        if f.floating_network_id and not f.port_id:
-            fip = f
-            break
-    if not fip:
-        fip = conn.network.create_ip(floating_network_id=net.id)
+    # 3) Prendi un FIP dal pool, oppure prenota un FIP libero (o creane uno)
+    if pool is not None:
+        take = pool.take
+    else:
+        # risolviamo la rete esterna -> net.id
+        net = conn.network.find_network(network_name, ignore_missing=False)
+        take = lambda: claimed.append(_claim_free_fip(conn, net)) or claimed[-1]
+    claimed = []
+    fip = take()
 
     # 4) Trova il port della VM e associa il FIP (Neutron)
-    deadline = time.time() + wait_secs
+    deadline = clock.time() + wait_secs
     last_err = None
-    while time.time() < deadline:
-        try:
-            # ricarica server e cerca un port collegato
-            server = conn.compute.get_server(server.id)
-            vm_ports = list(conn.network.ports(device_id=server.id))
-            port = vm_ports[0] if vm_ports else None
-            if not port:
-                time.sleep(3)
-                continue
-
-            # se qualcuno lo ha già associato nel frattempo, siamo a posto
-            if fip.port_id == port.id:
-                return fip
+    try:
+        while clock.time() < deadline:
+            try:
+                port = waiter.wait("port", server.id, ready=lambda p: p is not None,
+                                   timeout=max(0.0, deadline - clock.time()), what="port della VM")
+                if fip.port_id and fip.port_id != port.id:
+                    # associato nel frattempo a un'altra VM (altro processo): ne serve un altro
+                    log(f"Floating IP {fip.floating_ip_address} preso da un'altra VM, ne uso un altro","!")
+                    fip = take()
+                    continue
+                if fip.port_id != port.id:
+                    # associazione FIP -> port (Neutron); un FIP del pool perde la marcatura
+                    if pool is not None:
+                        conn.network.update_ip(fip, port_id=port.id, description="")
+                    else:
+                        conn.network.update_ip(fip, port_id=port.id)
+                    # rilettura: conta solo ciò che Neutron ha davvero associato
+                    fip = conn.network.get_ip(fip.id)
+                # double-check: se ora ha port_id, ok
+                if fip.port_id == port.id:
+                    break
+            except Exception as e:
+                last_err = e
+            clock.sleep(waiter.min_poll)
+        else:
+            if pool is not None:
+                pool.put_back(fip)
+            raise last_err or RuntimeError("Impossibile associare il Floating IP entro il timeout.")
+    finally:
+        _release_fip_claims(*claimed)
 
-            # associazione FIP -> port (Neutron)
-            fip = conn.network.update_ip(fip, port_id=port.id)
+    took = clock.time() - t0
+    log(f"Floating IP {fip.floating_ip_address} associato in {took:.1f}s" + (" (pool)" if pool is not None else ""),"i")
+    if pool is not None:
+        pool.record(took)
+    return fip
 
-            # double-check: se ora ha port_id, ok
-            if fip.port_id == port.id:
-                return fip
-        except Exception as e:
-            last_err = e
-        time.sleep(3)
 
-    raise last_err or RuntimeError("Impossibile associare il Floating IP entro il timeout.")
+def snapshot_name(vm_name):
+    return f"{vm_name}-snap-{datetime.now().strftime('%Y%m%d-%H%M')}"
 
+def snapshot_tag(vm_name):
+    """Tag Glance degli snapshot di una VM: permette a Glance di filtrarli lato server."""
+    return f"snap-of:{vm_name}"
 
-def snapshot_and_wait(conn, server, snap_name, timeout=900):
+def start_snapshot(conn, server, snap_name):
+    """Avvia lo snapshot (una create + un tag) senza attenderlo."""
     img = conn.compute.create_server_image(server, name=snap_name)
-    start = time.time()
-    while time.time()-start < timeout:
-        im = conn.image.get_image(img)
-        if getattr(im, "status", "").lower()=="active":
-            return im
-        if getattr(im, "status","").lower() in ("killed","error"):
-            raise RuntimeError(f"Snapshot fallito: status={im.status}")
-        time.sleep(3)
-    raise TimeoutError("Timeout snapshot")
+    conn.image.add_tag(img, snapshot_tag(server.name))
+    return img
 
-def prune_old_snapshots(conn, base_name, retain):
+def wait_snapshot(conn, img, timeout=900, clock=time, waiter=None):
+    waiter = waiter or Waiter(conn, clock=clock)
+
+    def failed(im):
+        if im is None:
+            return "Snapshot sparito"
+        if getattr(im, "status", "").lower() in ("killed", "error"):
+            return f"Snapshot fallito: status={im.status}"
+        return None
+    return waiter.wait("image", img.id, ready=lambda im: im is not None and getattr(im, "status", "").lower() == "active",
+                       failed=failed, timeout=timeout, what="snapshot")
+
+def snapshot_and_wait(conn, server, snap_name, timeout=900, clock=time, waiter=None):
+    return wait_snapshot(conn, start_snapshot(conn, server, snap_name), timeout=timeout, clock=clock, waiter=waiter)
+
+def prune_old_snapshots(conn, base_name, retain, workers=4):
+    """Tiene solo i `retain` snapshot più recenti di `base_name`.
+
+    Filtro e ordinamento sono fatti da Glance (tag snap-of:<vm>, created_at desc):
+    niente listing completo delle immagini. Le delete partono in parallelo.
+    """
     if retain is None:
         return []
-    prefix = f"{base_name}-snap-"
-    snaps = [i for i in conn.image.images() if (i.name or "").startswith(prefix)]
-    def key(i):
-        return (getattr(i,"created_at",None) or getattr(i,"updated_at",None) or i.name)
-    snaps.sort(key=key, reverse=True)
+    snaps = list(conn.image.images(tag=snapshot_tag(base_name), sort_key="created_at", sort_dir="desc"))
     to_delete = snaps[retain:]
-    for im in to_delete:
-        conn.image.delete_image(im.id, ignore_missing=True)
-    return to_delete
+    deleted, failed = _delete_all(to_delete, lambda im: conn.image.delete_image(im.id, ignore_missing=True), workers)
+    for im, e in failed:
+        log(f"Snapshot {im.name} non rimosso: {e}","!")
+    return deleted
 
-def main():
-    p = argparse.ArgumentParser()
-    p.add_argument("--name", default=None, help="Nome VM da creare")
-    p.add_argument("--retain", type=int, default=3, help="Quanti snapshot recenti mantenere (default: 3)")
-    p.add_argument("--no-snapshot", action="store_true", help="Non creare lo snapshot post-creazione")
-    p.add_argument("--cleanup", help="Base name per cleanup (VM/FIP/snaps)")
-    p.add_argument("--wipe-snaps", action="store_true", help="(cleanup) Rimuovi anche gli snapshot")
-    p.add_argument("--yes", action="store_true", help="Non chiedere conferme (cleanup)")
-    p.add_argument("--keypair", default=os.environ.get("DEPLOYVM_KEYPAIR","lab-key"),
-                   help="Nome keypair da usare/creare (default: %(default)s)")
-    p.add_argument("--pubkey-file", default=os.environ.get("DEPLOYVM_PUBKEY"),
-                   help="Pubkey file da caricare se il keypair non esiste")
-    args = p.parse_args()
+def _image_stores(img):
+    # con Glance multi-store `stores` è "id1,id2"; senza multi-store l'attributo manca
+    return [x.strip() for x in (getattr(img, "stores", None) or "").split(",") if x.strip()]
 
-    log("Connessione a OpenStack...")
-    conn = connection.Connection(cloud='microstack')
+def latest_snapshot(conn, vm_name, stores=None):
+    """Snapshot ACTIVE più recente di `vm_name`, o None.
 
-    if args.cleanup:
-        base = args.cleanup
-        log(f"Cleanup per base name: '{base}'","*")
-        servers = [s for s in conn.compute.servers() if s.name==base or s.name.startswith(base+"-")]
-        if servers:
-            log(f"VM da cancellare: {[s.name for s in servers]}","i")
-            if args.yes or input(f"Confermi cancellazione di {len(servers)} VM? [y/N] ").lower()=="y":
-                for s in servers:
-                    conn.compute.delete_server(s, ignore_missing=True)
-                    log(f"Eliminazione VM avviata: {s.name} ({s.id})","+")
-        else:
-            log(f"Nessuna VM da cancellare per base '{base}'","i")
-        orphans = [f for f in conn.network.ips() if f.status=="DOWN"]
-        if orphans:
-            log(f"Floating IP orfani da rimuovere: {[f.floating_ip_address for f in orphans]}","i")
-            if args.yes or input(f"Confermi cancellazione di {len(orphans)} FIP orfani? [y/N] ").lower()=="y":
-                for f in orphans:
-                    conn.network.delete_ip(f.id, ignore_missing=True)
-                    log(f"FIP rimosso: {f.floating_ip_address}","+")
-        else:
-            log("Nessun Floating IP orfano","i")
-        if args.wipe_snaps:
-            prefix = f"{base}-snap-"
-            snaps = [i for i in conn.image.images() if (i.name or "").startswith(prefix)]
-            if snaps:
-                log(f"Snapshot da rimuovere: {[i.name for i in snaps]}","i")
-                for im in snaps:
-                    conn.image.delete_image(im.id, ignore_missing=True)
-                    log(f"Snapshot rimosso: {im.name} (ID: {im.id})","+")
-            else:
-                log(f"Nessuno snapshot con prefisso '{prefix}'","i")
-        log(f"Cleanup terminato per base '{base}'","+")
-        return
+    Una sola query filtrata da Glance (tag snap-of:<vm>, status, created_at desc).
+    Con `stores` (ID dei backend Glance, es. ["local"]) preferisce il più recente
+    presente su uno di quei backend, altrimenti ripiega sul più recente.
+    """
+    query = dict(tag=snapshot_tag(vm_name), status="active", sort_key="created_at", sort_dir="desc")
+    if not stores:
+        # l'SDK pagina in modo lazy: con limit=1 basta leggere il primo elemento per fare una sola richiesta
+        return next(iter(conn.image.images(limit=1, **query)), None)
+    snaps = list(conn.image.images(**query))
+    preferred = next((im for im in snaps if set(_image_stores(im)) & set(stores)), None)
+    return preferred or (snaps[0] if snaps else None)
+
+def _split_stores(spec):
+    return [x.strip() for x in (spec or "").split(",") if x.strip()]
+
+def clone_image(conn, ctx, source_vm, stores=None):
+    """Immagine di boot per un clone di `source_vm`: il suo ultimo snapshot, altrimenti ctx.image."""
+    img = latest_snapshot(conn, source_vm, stores)
+    if img is None:
+        log(f"Nessuno snapshot di '{source_vm}' (tag {snapshot_tag(source_vm)}): uso '{ctx.image.name}'","i")
+        return ctx.image
+    where = ",".join(_image_stores(img)) or "default"
+    log(f"Boot da snapshot '{img.name}' (ID: {img.id}, store: {where})","i")
+    return img
+
+class SnapshotQueue:
+    """Snapshot post-boot e pruning della retention fuori dal percorso critico del provisioning.
+
+    submit() avvia lo snapshot subito (così esiste anche se il processo termina)
+    e affida attesa e pruning a un pool di thread; ritorna un Future.
+    """
+
+    def __init__(self, conn, clock=time, workers=2, executor=None, waiter=None, timeout=900):
+        self.conn = conn
+        self.clock = clock
+        self.executor = executor or ThreadPoolExecutor(max_workers=workers, thread_name_prefix="snapshot")
+        self.waiter = waiter
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.jobs = []
+
+    def submit(self, server, snap_name, retain=3):
+        img = start_snapshot(self.conn, server, snap_name)
+        fut = self.executor.submit(self._finish, server.name, img, retain)
+        with self.lock:
+            self.jobs = [f for f in self.jobs if not f.done()] + [fut]
+        return img, fut
+
+    def _finish(self, vm_name, img, retain):
+        try:
+            im = wait_snapshot(self.conn, img, timeout=self.timeout, clock=self.clock, waiter=self.waiter)
+            log(f"Snapshot creato: {im.name} (ID: {im.id})","+")
+            for old in prune_old_snapshots(self.conn, vm_name, retain):
+                log(f"Snapshot vecchio rimosso: {old.name} (ID: {old.id})","i")
+            return im
+        except Exception as e:
+            log(f"Snapshot di '{vm_name}' fallito: {e}","!")
+            raise
+
+    def pending(self):
+        with self.lock:
+            return [f for f in self.jobs if not f.done()]
 
-    base_name = (args.name or input("Inserisci il nome base della nuova VM: ").strip()) or "VM-test"
-    net, subnet, router = ensure_network_bits(conn)
-    sg = ensure_secgroup(conn)
-    ensure_keypair(conn, args.keypair, args.pubkey_file)
+    def close(self, wait=True):
+        self.executor.shutdown(wait=wait)
 
-    image = pick_image(conn, "cirros")
-    flavor = pick_flavor(conn, "m1.tiny")
+# ------------------------
+# Tracing per fase (--trace)
+# ------------------------
+class _CountingProxy:
+    def __init__(self, target, service, owner):
+        self._target = target
+        self._service = service
+        self._owner = owner
 
-    # Calcola il prossimo nome disponibile del tipo base_N (VM-test_1, VM-test_2, ...)
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        if not callable(attr) or name.startswith("_"):
+            return attr
+        key = f"{self._service}.{name}"
+
+        def call(*a, **kw):
+            self._owner._count(key)
+            return attr(*a, **kw)
+        return call
+
+class CountingConnection:
+    """Proxy di una Connection che conta le chiamate SDK su compute/network/image."""
+    SERVICES = ("compute", "network", "image")
+
+    def __init__(self, conn):
+        self._conn = conn
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.by_call = {}           # "compute.get_server" -> numero di chiamate
+        for svc in self.SERVICES:
+            setattr(self, svc, _CountingProxy(getattr(conn, svc), svc, self))
+
+    def _count(self, key):
+        with self._lock:
+            self.calls += 1
+            self.by_call[key] = self.by_call.get(key, 0) + 1
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.by_call)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+class PhaseTracer:
+    """Registra durata e chiamate API di ogni fase del provisioning.
+
+    Le chiamate sono contate solo se `conn` è una CountingConnection; il
+    conteggio per fase presuppone che nessun altro thread usi la stessa
+    connessione nel frattempo.
+    """
+
+    def __init__(self, conn=None, clock=time):
+        self.conn = conn if isinstance(conn, CountingConnection) else None
+        self.clock = clock
+        self.started = clock.time()
+        self.phases = []
+
+    @contextmanager
+    def phase(self, name):
+        rec = {"name": name, "ok": True}
+        before = self.conn.snapshot() if self.conn else {}
+        t0 = self.clock.time()
+        try:
+            yield rec
+        except BaseException as e:
+            rec["ok"] = False; rec["error"] = str(e) or type(e).__name__
+            raise
+        finally:
+            rec["seconds"] = round(self.clock.time() - t0, 3)
+            if self.conn:
+                after = self.conn.snapshot()
+                rec["calls"] = {k: v - before.get(k, 0) for k, v in after.items() if v != before.get(k, 0)}
+                rec["api_calls"] = sum(rec["calls"].values())
+            self.phases.append(rec)
+
+    def report(self):
+        return {
+            "started": datetime.fromtimestamp(self.started).isoformat(timespec="seconds"),
+            "total_seconds": round(sum(p["seconds"] for p in self.phases), 3),
+            "api_calls": sum(p.get("api_calls", 0) for p in self.phases),
+            "phases": self.phases,
+        }
+
+    def summary(self):
+        for p in self.phases:
+            calls = f", {p['api_calls']} chiamate API" if "api_calls" in p else ""
+            log(f"{p['name']:<22} {p['seconds']:8.2f}s{calls}" + ("" if p["ok"] else f"  ERRORE: {p['error']}"), "t")
+
+    def write(self, path):
+        with open(path, "w") as f:
+            json.dump(self.report(), f, indent=2)
+
+def _phase(tracer, name):
+    return tracer.phase(name) if tracer else nullcontext()
+
+# ------------------------
+# API importabile (usata anche da autoscale_watch.py)
+# ------------------------
+@dataclass
+class DeployContext:
+    """Handle già risolti e riusabili tra più create_replica sulla stessa connessione."""
+    net: object
+    sg: object
+    image: object
+    flavor: object
+    keypair: str
+    clock: object = field(default=time)     # time() / sleep(): il simulatore passa un clock virtuale
+    fip_pool: object = None                 # FipPool opzionale (FIP pre-allocati)
+    snapshots: object = None                # SnapshotQueue opzionale: snapshot post-boot in background
+    waiter: object = None                   # Waiter condiviso tra i create_replica concorrenti
+    revalidate: object = None               # () -> DeployContext fresco, se gli handle vengono da StartupCache
+
+@dataclass
+class Replica:
+    server: object
+    fip: object
+    snapshot: object = None
+    snapshot_job: object = None     # Future del completamento in background (SnapshotQueue)
+
+    @property
+    def address(self):
+        return getattr(self.fip, "floating_ip_address", self.fip)
+
+# ------------------------
+# Cache di avvio: token Keystone e ID risolti
+# ------------------------
+CACHE_DIR = os.environ.get("DEPLOYVM_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "deploy_secure_vm"))
+AUTH_MARGIN = 300       # s: un token che scade entro questo margine non viene riusato
+
+class StartupCache:
+    """File JSON (0600) per cloud e utente con token/catalogo Keystone e handle di prepare_context.
+
+    Il token è riusato finché non è vicino alla scadenza. Gli ID di rete, SG,
+    immagine e flavor sono riusati senza discovery e ricontrollati solo quando
+    una chiamata che li usa fallisce (DeployContext.revalidate).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        try:
+            with open(path) as f:
+                self.data = json.load(f)
+        except (OSError, ValueError):
+            self.data = {}
+
+    @classmethod
+    def for_connection(cls, conn, cloud, cache_dir=CACHE_DIR):
+        # identità senza segreti: un cambio di utente/progetto/endpoint usa un altro file
+        auth = (getattr(getattr(conn, "config", None), "config", None) or {}).get("auth") or {}
+        ident = {k: v for k, v in auth.items() if not any(x in k for x in ("password", "secret", "token"))}
+        digest = hashlib.sha256(json.dumps(ident, sort_keys=True, default=str).encode()).hexdigest()[:12]
+        return cls(os.path.join(cache_dir, f"{cloud}-{digest}.json"))
+
+    def update(self, **sections):
+        with self.lock:
+            self.data.update(sections)
+            try:
+                os.makedirs(os.path.dirname(self.path), mode=0o700, exist_ok=True)
+                tmp = f"{self.path}.{os.getpid()}.tmp"
+                with os.fdopen(os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "w") as f:
+                    json.dump(self.data, f)
+                os.replace(tmp, self.path)
+            except OSError as e:
+                log(f"Cache di avvio non scrivibile ({self.path}): {e}","!")
+
+    def restore_auth(self, conn):
+        st = self.data.get("auth") or {}
+        if st.get("expires_at", 0) - time.time() < AUTH_MARGIN:
+            return False
+        try:
+            conn.session.auth.set_auth_state(st["state"])
+        except Exception:
+            return False
+        return True
+
+    def save_auth(self, conn):
+        try:
+            plugin = conn.session.auth
+            state = plugin.get_auth_state()
+            expires = plugin.auth_ref.expires.timestamp()
+        except Exception:
+            return
+        if state and state != (self.data.get("auth") or {}).get("state"):
+            self.update(auth={"state": state, "expires_at": expires})
+
+    def load_context(self, keypair, image_name, flavor_name):
+        """(net, sg, image, flavor) dalla cache se corrispondono alla richiesta, altrimenti None."""
+        c = self.data.get("context") or {}
+        if (c.get("keypair"), c.get("image_name"), c.get("flavor_name")) != (keypair, image_name, flavor_name):
+            return None
+        try:
+            return tuple(SimpleNamespace(**c[k]) for k in ("net", "sg", "image", "flavor"))
+        except (KeyError, TypeError):
+            return None
+
+    def save_context(self, ctx, image_name, flavor_name):
+        ref = lambda r: {"id": r.id, "name": r.name}
+        self.update(context={"keypair": ctx.keypair, "image_name": image_name, "flavor_name": flavor_name,
+                             "net": ref(ctx.net), "sg": ref(ctx.sg), "image": ref(ctx.image),
+                             "flavor": ref(ctx.flavor)})
+
+def connect(cloud="microstack", cache_dir=CACHE_DIR):
+    """Connection dell'SDK. Con `cache_dir` riusa il token (e il catalogo) salvato da un'esecuzione precedente."""
+    from openstack import connection
+    conn = connection.Connection(cloud=cloud)
+    if cache_dir:
+        cache = conn.deploy_cache = StartupCache.for_connection(conn, cloud, cache_dir)
+        if cache.restore_auth(conn):
+            log("Token Keystone riusato dalla cache","i")
+        atexit.register(cache.save_auth, conn)      # token nuovo o rinnovato durante l'esecuzione
+    return conn
+
+def _discover_context(conn, keypair, pubkey_file, image_name, flavor_name, clock, tracer):
+    with _phase(tracer, "ensure_network_bits"):
+        net, subnet, router = ensure_network_bits(conn)
+    with _phase(tracer, "ensure_secgroup"):
+        sg = ensure_secgroup(conn)
+    with _phase(tracer, "ensure_keypair"):
+        ensure_keypair(conn, keypair, pubkey_file)
+    with _phase(tracer, "pick_image"):
+        image = pick_image(conn, image_name)
+    with _phase(tracer, "pick_flavor"):
+        flavor = pick_flavor(conn, flavor_name)
+    return DeployContext(net=net, sg=sg, image=image, flavor=flavor, keypair=keypair, clock=clock,
+                         waiter=Waiter(conn, clock=clock))
+
+def prepare_context(conn, keypair, pubkey_file=None, image_name="cirros", flavor_name="m1.tiny", clock=time,
+                    tracer=None, cache=None):
+    """Esegue una sola volta i controlli idempotenti (rete, SG, keypair, immagine, flavor).
+
+    Con una StartupCache (di default quella di connect(); cache=False la esclude)
+    riusa gli ID già risolti senza chiamate API; la discovery completa si rifà se
+    create_server li rifiuta.
+    """
+    if cache is None:
+        cache = getattr(conn, "deploy_cache", None)
+
+    def discover():
+        ctx = _discover_context(conn, keypair, pubkey_file, image_name, flavor_name, clock, tracer)
+        if cache:
+            cache.save_context(ctx, image_name, flavor_name)
+            cache.save_auth(conn)
+        return ctx
+
+    cached = cache.load_context(keypair, image_name, flavor_name) if cache else None
+    if cached is None:
+        return discover()
+    with _phase(tracer, "cached_context"):
+        net, sg, image, flavor = cached
+        log(f"Rete/SG/keypair/immagine/flavor dalla cache ({cache.path}): discovery saltata","i")
+    return DeployContext(net=net, sg=sg, image=image, flavor=flavor, keypair=keypair, clock=clock,
+                         waiter=Waiter(conn, clock=clock), revalidate=discover)
+
+def _revalidate_context(ctx, error):
+    log(f"create_server rifiutata con gli handle in cache ({error}): rifaccio la discovery","!")
+    fresh = ctx.revalidate()
+    ctx.net, ctx.sg, ctx.image, ctx.flavor = fresh.net, fresh.sg, fresh.image, fresh.flavor
+    ctx.revalidate = None
+
+def next_vm_name(conn, base_name):
+    """Calcola il prossimo nome disponibile del tipo base_N (VM-test_1, VM-test_2, ...)."""
     pattern = re.compile(rf"^{re.escape(base_name)}_(\d+)$")
     nums = []
     for s in conn.compute.servers():
@@ -277,41 +906,305 @@ def main():
             except ValueError:
                 pass
     next_num = (max(nums) + 1) if nums else 1
-    vm_name = f"{base_name}_{next_num}"
+    return f"{base_name}_{next_num}"
+
+def create_replica(conn, ctx, base_name, snapshot=True, retain=3, name=None, on_created=None, tracer=None,
+                   timeout=900, image=None):
+    """Crea la VM `<base_name>_N` (o `name`) con FIP (ed eventuale snapshot) usando un DeployContext.
+
+    `on_created(server)` viene chiamato appena Nova accetta la richiesta, prima dell'attesa ACTIVE.
+    `timeout` è un'unica scadenza per boot, FIP e snapshot insieme.
+    `image` sostituisce ctx.image (es. clone_image() per partire dallo snapshot della base).
+    """
+    clock = ctx.clock
+    waiter = ctx.waiter or Waiter(conn, clock=clock)
+    deadline = clock.time() + timeout
+    left = lambda: max(1.0, deadline - clock.time())
+    if name:
+        vm_name = name
+    else:
+        with _phase(tracer, "next_vm_name"):
+            vm_name = next_vm_name(conn, base_name)
 
     log(f"Creazione/verifica VM {vm_name}...","*")
-    server = conn.compute.create_server(
-        name=vm_name,
-        image_id=image.id,
-        flavor_id=flavor.id,
-        networks=[{"uuid": net.id}],
-        key_name=args.keypair,
-        security_groups=[{"name": sg.name}],
-        config_drive=True,
-    )
-    server = wait_server_active(conn, server.id, timeout=600)
-    fip = ensure_fip(conn, server)
-
-    snap_id = None
-    snap_name = None
-    if not args.no_snapshot:
-        snap_name = f"{vm_name}-snap-{datetime.now().strftime('%Y%m%d-%H%M')}"
+    stock = image is None or image is ctx.image
+
+    def create():
+        return conn.compute.create_server(
+            name=vm_name,
+            image_id=(ctx.image if stock else image).id,
+            flavor_id=ctx.flavor.id,
+            networks=[{"uuid": ctx.net.id}],
+            key_name=ctx.keypair,
+            security_groups=[{"name": ctx.sg.name}],
+            config_drive=True,
+        )
+    with _phase(tracer, "create_server"):
+        try:
+            server = create()
+        except Exception as e:
+            # 400/404 con ID dalla cache: rete/SG/immagine/flavor/keypair cambiati dall'ultima discovery
+            if ctx.revalidate is None or getattr(e, "status_code", None) not in (400, 404):
+                raise
+            _revalidate_context(ctx, e)
+            server = create()
+    if on_created:
+        on_created(server)
+    with _phase(tracer, "wait_server_active"):
+        server = wait_server_active(conn, server.id, timeout=left(), clock=clock, waiter=waiter)
+    with _phase(tracer, "ensure_fip"):
+        fip = ensure_fip(conn, server, wait_secs=min(120.0, left()), clock=clock, pool=ctx.fip_pool, waiter=waiter)
+    replica = Replica(server=server, fip=fip)
+
+    if snapshot and ctx.snapshots is not None:
+        snap_name = snapshot_name(vm_name)
+        with _phase(tracer, "start_snapshot"):
+            replica.snapshot, replica.snapshot_job = ctx.snapshots.submit(server, snap_name, retain)
+        log(f"Snapshot '{snap_name}' avviato in background","*")
+    elif snapshot:
+        snap_name = snapshot_name(vm_name)
         log(f"Creazione snapshot '{snap_name}'...","*")
-        img = snapshot_and_wait(conn, server, snap_name)
+        with _phase(tracer, "snapshot_and_wait"):
+            img = snapshot_and_wait(conn, server, snap_name, timeout=left(), clock=clock, waiter=waiter)
         log(f"Snapshot creato: {snap_name} (ID: {img.id})","+")
-        snap_id = img.id
-        deleted = prune_old_snapshots(conn, vm_name, args.retain)
+        replica.snapshot = img
+        with _phase(tracer, "prune_old_snapshots"):
+            deleted = prune_old_snapshots(conn, vm_name, retain)
         for im in deleted:
             log(f"Snapshot vecchio rimosso: {im.name} (ID: {im.id})","i")
+    return replica
+
+@dataclass
+class CleanupReport:
+    """Esito di un cleanup: cosa è stato rimosso davvero, cosa no."""
+    servers: list = field(default_factory=list)          # nomi delle VM confermate sparite
+    servers_pending: list = field(default_factory=list)  # ancora presenti allo scadere del timeout
+    fips: list = field(default_factory=list)
+    snapshots: list = field(default_factory=list)
+    errors: list = field(default_factory=list)           # (risorsa, errore)
+    seconds: float = 0.0
+
+    @property
+    def ok(self):
+        return not self.servers_pending and not self.errors
+
+def _delete_all(items, delete, workers):
+    """Esegue delete(item) in parallelo (al più `workers` alla volta) -> (riusciti, [(item, errore)])."""
+    if not items:
+        return [], []
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(items))), thread_name_prefix="cleanup") as ex:
+        futs = [(it, ex.submit(delete, it)) for it in items]
+    done, failed = [], []
+    for it, f in futs:
+        err = f.exception()
+        (failed.append((it, err)) if err else done.append(it))
+    return done, failed
+
+def wait_servers_gone(conn, server_ids, timeout=300, clock=time, waiter=None):
+    """Attende che le VM spariscano da Nova; una sola query per giro, qualunque sia il loro numero.
+
+    Ritorna gli id ancora presenti allo scadere del timeout.
+    """
+    waiter = waiter or Waiter(conn, clock=clock)
+    _, pending = waiter.wait_all("server", server_ids, ready=lambda s: s is None or s.status == "DELETED",
+                                 timeout=timeout, what="eliminazione VM")
+    return pending
+
+def _server_fips(conn, servers):
+    """FIP associati alle VM `servers` (via port della VM o addresses Nova) -> {fip.id: (fip, server.id)}."""
+    owner = {}
+    for s in servers:
+        for port in conn.network.ports(device_id=s.id):
+            owner[port.id] = s.id
+        for addr_list in (getattr(s, "addresses", None) or {}).values():
+            for ipinfo in addr_list:
+                if ipinfo.get("OS-EXT-IPS:type") == "floating":
+                    owner[ipinfo["addr"]] = s.id
+    out = {}
+    for f in conn.network.ips():
+        sid = owner.get(f.port_id) or owner.get(f.floating_ip_address)
+        if sid and getattr(f, "description", "") != FIP_POOL_TAG:
+            out[f.id] = (f, sid)
+    return out
+
+def cleanup(conn, base, wipe_snaps=False, yes=False, tracer=None, workers=8, timeout=300, wait=True,
+            clock=time, sweep_orphans=False, legacy_snaps=False):
+    """Rimuove le VM `base` / `base-*`, i loro FIP e (opzionale) gli snapshot `base-snap-*`.
+
+    Le delete partono in parallelo su un pool di `workers` thread; con `wait` le VM
+    devono risultare sparite entro `timeout` secondi prima di passare ai FIP.
+    Sono rilasciati solo i FIP delle VM eliminate: un FIP libero può appartenere a
+    un clone in boot (scale-up concorrente, altri gruppi). `sweep_orphans` (solo
+    CLI) rilascia anche gli altri FIP non associati a nessun port.
+    Gli snapshot sono cercati per tag snap-of:<vm> (base e VM eliminate);
+    `legacy_snaps` (solo CLI) scorre anche tutte le immagini per quelli senza tag.
+    """
+    report = CleanupReport()
+    t0 = clock.time()
+    with _phase(tracer, "cleanup"):
+        log(f"Cleanup per base name: '{base}'","*")
+        servers = [s for s in conn.compute.servers() if s.name==base or s.name.startswith(base+"-")]
+        owned = _server_fips(conn, servers) if servers else {}
+        gone = set()
+        if servers:
+            log(f"VM da cancellare: {[s.name for s in servers]}","i")
+            if yes or input(f"Confermi cancellazione di {len(servers)} VM? [y/N] ").lower()=="y":
+                fired, failed = _delete_all(servers, lambda s: conn.compute.delete_server(s, ignore_missing=True),
+                                            workers)
+                report.errors += [(s.name, e) for s, e in failed]
+                log(f"Eliminazione avviata per {len(fired)} VM","+")
+                gone = {s.id for s in fired}
+                if wait and fired:
+                    pending = wait_servers_gone(conn, [s.id for s in fired], timeout=timeout, clock=clock)
+                    report.servers = [s.name for s in fired if s.id not in pending]
+                    report.servers_pending = [s.name for s in fired if s.id in pending]
+                    gone -= set(pending)
+                    if pending:
+                        log(f"VM ancora presenti dopo {timeout}s: {report.servers_pending}","!")
+                else:
+                    report.servers = [s.name for s in fired]
+        else:
+            log(f"Nessuna VM da cancellare per base '{base}'","i")
+        # i FIP di VM ancora presenti restano (sono ancora associati); quelli liberi del FipPool pure
+        orphans = [f for f, sid in owned.values() if sid in gone]
+        if sweep_orphans:
+            orphans += [f for f in conn.network.ips(status="DOWN")
+                        if not f.port_id and f.id not in owned and getattr(f, "description", "") != FIP_POOL_TAG]
+        if orphans:
+            log(f"Floating IP da rimuovere: {[f.floating_ip_address for f in orphans]}","i")
+            if yes or input(f"Confermi cancellazione di {len(orphans)} FIP? [y/N] ").lower()=="y":
+                done, failed = _delete_all(orphans, lambda f: conn.network.delete_ip(f.id, ignore_missing=True),
+                                           workers)
+                report.fips = [f.floating_ip_address for f in done]
+                report.errors += [(f.floating_ip_address, e) for f, e in failed]
+        else:
+            log("Nessun Floating IP da rimuovere","i")
+        if wipe_snaps:
+            prefix = f"{base}-snap-"
+            snaps = {}
+            for vm in sorted({base} | {s.name for s in servers}):
+                snaps.update((im.id, im) for im in conn.image.images(tag=snapshot_tag(vm)))
+            if legacy_snaps:
+                # snapshot delle versioni precedenti, senza tag: serve il listing completo
+                snaps.update((im.id, im) for im in conn.image.images() if (im.name or "").startswith(prefix))
+            snaps = list(snaps.values())
+            if snaps:
+                log(f"Snapshot da rimuovere: {[i.name for i in snaps]}","i")
+                done, failed = _delete_all(snaps, lambda im: conn.image.delete_image(im.id, ignore_missing=True),
+                                           workers)
+                report.snapshots = [im.name for im in done]
+                report.errors += [(im.name, e) for im, e in failed]
+            else:
+                log(f"Nessuno snapshot di '{base}' da rimuovere","i")
+    report.seconds = clock.time() - t0
+    for what, err in report.errors:
+        log(f"Eliminazione di {what} fallita: {err}","!")
+    log(f"Cleanup terminato per base '{base}' in {report.seconds:.1f}s: {len(report.servers)} VM, "
+        f"{len(report.fips)} FIP, {len(report.snapshots)} snapshot rimossi"
+        + (f", {len(report.servers_pending)} VM non confermate" if report.servers_pending else "")
+        + (f", {len(report.errors)} errori" if report.errors else ""), "+" if report.ok else "!")
+    return report
+
+def destroy_replica(conn, name, wipe_snaps=True, tracer=None, timeout=300, clock=time):
+    """Elimina una singola replica (VM `name`, FIP orfani, snapshot) senza conferme.
+
+    Ritorna solo quando la VM è sparita davvero (quota liberata); RuntimeError altrimenti.
+    """
+    report = cleanup(conn, name, wipe_snaps=wipe_snaps, yes=True, tracer=tracer, timeout=timeout, clock=clock)
+    if not report.ok:
+        raise RuntimeError(f"cleanup di '{name}' incompleto: VM ancora presenti {report.servers_pending}, "
+                           f"errori {[w for w, _ in report.errors]}")
+    return report
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--name", default=None, help="Nome VM da creare")
+    p.add_argument("--retain", type=int, default=3, help="Quanti snapshot recenti mantenere (default: 3)")
+    p.add_argument("--no-snapshot", action="store_true", help="Non creare lo snapshot post-creazione")
+    p.add_argument("--no-wait-snapshot", action="store_true",
+                   help="Esci appena la VM è pronta: lo snapshot prosegue in Glance, senza attesa né pruning")
+    p.add_argument("--from-snapshot", metavar="VM",
+                   help="Avvia la nuova VM dall'ultimo snapshot di VM (tag snap-of:VM) invece che da cirros")
+    p.add_argument("--image-store", default=os.environ.get("DEPLOYVM_IMAGE_STORE", ""),
+                   help="(--from-snapshot) Store Glance preferiti, separati da virgola (es. local)")
+    p.add_argument("--cleanup", help="Base name per cleanup (VM/FIP/snaps)")
+    p.add_argument("--wipe-snaps", action="store_true", help="(cleanup) Rimuovi anche gli snapshot")
+    p.add_argument("--yes", action="store_true", help="Non chiedere conferme (cleanup)")
+    p.add_argument("--workers", type=int, default=8, help="(cleanup) Delete in parallelo (default: 8)")
+    p.add_argument("--timeout", type=int, default=300,
+                   help="(cleanup) Secondi di attesa perché le VM spariscano davvero (default: 300)")
+    p.add_argument("--no-wait", action="store_true", help="(cleanup) Non attendere la sparizione delle VM")
+    p.add_argument("--sweep-orphan-fips", action="store_true",
+                   help="(cleanup) Rilascia anche i FIP non associati di altre VM (ferma prima l'autoscaler)")
+    p.add_argument("--release-fip-pool", action="store_true",
+                   help="(cleanup) Rilascia anche i FIP liberi del pool dell'autoscaler")
+    p.add_argument("--keypair", default=os.environ.get("DEPLOYVM_KEYPAIR","lab-key"),
+                   help="Nome keypair da usare/creare (default: %(default)s)")
+    p.add_argument("--pubkey-file", default=os.environ.get("DEPLOYVM_PUBKEY"),
+                   help="Pubkey file da caricare se il keypair non esiste")
+    p.add_argument("--no-cache", action="store_true",
+                   help="Ignora la cache di avvio (token Keystone e ID risolti in $DEPLOYVM_CACHE_DIR)")
+    p.add_argument("--trace", metavar="OUT.json",
+                   help="Scrive durata e chiamate API di ogni fase in un report JSON")
+    args = p.parse_args()
+
+    log("Connessione a OpenStack...")
+    conn = connect(cache_dir=None if args.no_cache else CACHE_DIR)
+    tracer = None
+    if args.trace:
+        # l'autenticazione è lazy: il suo costo finisce nella prima fase (ensure_network_bits)
+        conn = CountingConnection(conn)
+        tracer = PhaseTracer(conn)
+
+    try:
+        if args.cleanup:
+            report = cleanup(conn, args.cleanup, wipe_snaps=args.wipe_snaps, yes=args.yes, tracer=tracer,
+                             workers=args.workers, timeout=args.timeout, wait=not args.no_wait,
+                             sweep_orphans=args.sweep_orphan_fips, legacy_snaps=True)
+            if args.release_fip_pool:
+                released = release_fip_pool(conn)
+                log(f"FIP del pool rilasciati: {released}" if released else "Nessun FIP libero nel pool","i")
+            if not report.ok:
+                sys.exit(1)
+            return
+
+        base_name = (args.name or input("Inserisci il nome base della nuova VM: ").strip()) or "VM-test"
+        ctx = prepare_context(conn, args.keypair, args.pubkey_file, tracer=tracer)
+        if not args.no_snapshot and not args.no_wait_snapshot:
+            ctx.snapshots = SnapshotQueue(conn, workers=1, waiter=ctx.waiter)
+        image = None
+        if args.from_snapshot:
+            with _phase(tracer, "pick_snapshot"):
+                image = clone_image(conn, ctx, args.from_snapshot, _split_stores(args.image_store))
+        replica = create_replica(conn, ctx, base_name, snapshot=not args.no_snapshot and not args.no_wait_snapshot,
+                                 retain=args.retain, tracer=tracer, image=image)
+        if not args.no_snapshot and args.no_wait_snapshot:
+            replica.snapshot = start_snapshot(conn, replica.server, snapshot_name(replica.server.name))
+    finally:
+        if tracer:
+            tracer.summary()
+            tracer.write(args.trace)
+            log(f"Trace scritto in {args.trace}", "i")
+    addr = replica.address
 
     print("\nVM pronta!\n")
     print("Comando SSH (ed25519 locale):")
-    print(f"ssh -o StrictHostKeyChecking=no -i {os.path.expanduser('~')}/.ssh/lab-key cirros@{getattr(fip, 'floating_ip_address', fip)}\n")
+    print(f"ssh -o StrictHostKeyChecking=no -i {os.path.expanduser('~')}/.ssh/lab-key cirros@{addr}\n")
     print("Se Cirros rifiuta ed25519, usa la RSA con algoritmi legacy (se hai generato ~/.ssh/lab-key-rsa):")
-    print(f"ssh -o StrictHostKeyChecking=no -o PubkeyAuthentication=yes -o PubkeyAcceptedAlgorithms=+ssh-rsa -o HostKeyAlgorithms=+ssh-rsa -i {os.path.expanduser('~')}/.ssh/lab-key-rsa cirros@{getattr(fip, 'floating_ip_address', fip)}\n")
-    if snap_id and snap_name:
-        print(f"Snapshot creato: {snap_name} (ID: {snap_id})\n")
+    print(f"ssh -o StrictHostKeyChecking=no -o PubkeyAuthentication=yes -o PubkeyAcceptedAlgorithms=+ssh-rsa -o HostKeyAlgorithms=+ssh-rsa -i {os.path.expanduser('~')}/.ssh/lab-key-rsa cirros@{addr}\n")
     print("Password di default Cirros (per test): cubswin:)\n")
+    if replica.snapshot_job is not None:
+        log("VM già utilizzabile; attendo il completamento dello snapshot in background...","i")
+        try:
+            img = replica.snapshot_job.result()
+        except Exception as e:
+            log(f"Snapshot fallito: {e}","!")
+            sys.exit(1)
+        finally:
+            ctx.snapshots.close()
+        print(f"Snapshot creato: {img.name} (ID: {img.id})\n")
+    elif replica.snapshot is not None and args.no_wait_snapshot:
+        log(f"Snapshot {replica.snapshot.name} avviato (ID: {replica.snapshot.id}): prosegue in Glance","i")
 
 if __name__ == "__main__":
     main()
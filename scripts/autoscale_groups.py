@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""Daemon multi-gruppo: più gruppi di autoscaling da un solo processo.
+
+Ogni sezione del file INI è un gruppo (VM base + `<base>_clone_N`) con le
+stesse opzioni di autoscale_watch.py, scritte senza `--` e con `_` al posto
+di `-`. [DEFAULT] vale per tutti i gruppi, [daemon] per il processo:
+
+  [daemon]
+  metrics_port = 9110
+  fip_pool = 2
+
+  [DEFAULT]
+  interval = 5
+  metric = max
+  ssh_key_path = ~/.ssh/lab-key-rsa
+
+  [web]
+  server = web_1
+  max_replicas = 6
+
+  [api]
+  server = api_1
+  high = 85
+
+Tutti i gruppi condividono una connessione OpenStack autenticata, un
+ServerInventory (un listing dei server per giro, non uno per gruppo), un
+DeployContext per keypair e un unico scheduler di campionamento: a ogni giro
+gli host di tutti i gruppi in scadenza sono campionati con un solo
+asyncio.gather.
+
+Esempio:
+  python3 scripts/autoscale_groups.py --config groups.ini
+"""
+import argparse, asyncio, configparser, os, sys, time
+
+import autoscale_watch as aw
+from autoscale_watch import ReplicaSet, ServerInventory, deployer
+from autoscale_metrics import ControllerMetrics, InstrumentedConnection, Registry, serve as serve_metrics
+
+# Opzioni di processo: valgono solo in [daemon]; in un gruppo o in [DEFAULT] sono un errore
+DAEMON_KEYS = {"metrics_port": int, "metrics_addr": str, "inventory_ttl": float,
+               "inventory_full_every": float, "fip_pool": int, "cloud": str}
+
+# ------------------------
+# Configurazione
+# ------------------------
+def _group_argv(parser, section, items):
+    actions = {a.dest: a for a in parser._actions if a.option_strings}
+    argv = ["--clone", "legacy"]
+    for key, value in items:
+        if key in DAEMON_KEYS:
+            raise ValueError(f"[{section}] {key} vale solo in [daemon]")
+        act = actions.get(key)
+        if act is None or key == "clone":
+            raise ValueError(f"[{section}] opzione sconosciuta: {key}")
+        if act.nargs == 0:          # flag store_true
+            if configparser.ConfigParser.BOOLEAN_STATES.get(value.lower(), False):
+                argv.append(act.option_strings[-1])
+        else:
+            argv += [act.option_strings[-1], value]
+    return argv
+
+def load_config(path):
+    """-> (opzioni del daemon, [(nome gruppo, args di autoscale_watch)])."""
+    cp = configparser.ConfigParser()
+    if not cp.read(path):
+        raise ValueError(f"config non leggibile: {path}")
+    daemon = {"metrics_port": int(os.environ.get("AUTOSCALE_METRICS_PORT", "0")), "metrics_addr": "127.0.0.1",
+              "inventory_ttl": 5.0, "inventory_full_every": 300.0, "fip_pool": 0, "cloud": "microstack"}
+    if cp.has_section("daemon"):
+        for key, value in cp.items("daemon"):
+            if key in DAEMON_KEYS:
+                daemon[key] = DAEMON_KEYS[key](value)
+            elif key not in cp.defaults():
+                raise ValueError(f"[daemon] opzione sconosciuta: {key}")
+    misplaced = sorted(set(cp.defaults()) & set(DAEMON_KEYS))
+    if misplaced:
+        raise ValueError(f"[DEFAULT] {', '.join(misplaced)}: valgono solo in [daemon]")
+    groups = []
+    parser = aw.build_parser()
+    for section in cp.sections():
+        if section == "daemon":
+            continue
+        items = dict(cp.items(section))
+        items.setdefault("server", section)
+        argv = _group_argv(parser, section, items.items())
+        try:
+            args = parser.parse_args(argv)
+        except SystemExit:
+            raise ValueError(f"[{section}] valori non validi")
+        groups.append((section, args))
+    if not groups:
+        raise ValueError(f"nessun gruppo in {path}")
+    servers = [a.server for _, a in groups]
+    dup = {s for s in servers if servers.count(s) > 1}
+    if dup:
+        raise ValueError(f"VM base usata da più gruppi: {', '.join(sorted(dup))}")
+    return daemon, groups
+
+# ------------------------
+# Campionamento condiviso
+# ------------------------
+class FleetSampler:
+    """Scheduler di campionamento unico: un asyncio.gather per giro su tutti i gruppi in scadenza."""
+
+    def __init__(self, window=1):
+        self.window = window
+        self.batch = {}         # (nome, fip) -> (cpu, mem, durata) | Exception
+
+    def prefetch(self, jobs):
+        """jobs: [(nome, fip, chiave SSH)] di tutti i gruppi del giro."""
+        self.batch = asyncio.run(self._gather(jobs)) if jobs else {}
+
+    async def _gather(self, jobs):
+        res = await asyncio.gather(*(aw.get_metrics_async(fip, key, self.window) for _, fip, key in jobs),
+                                   return_exceptions=True)
+        return {(name, fip): r for (name, fip, _), r in zip(jobs, res)}
+
+    def view(self, key_path):
+        return GroupSampler(self, key_path)
+
+class GroupSampler(aw.SshSampler):
+    """Interfaccia SshSampler di un gruppo: campioni del giro, SSH diretto solo per gli host nuovi."""
+
+    def __init__(self, fleet, key_path):
+        super().__init__(key_path, window=fleet.window)
+        self.fleet = fleet
+
+    def sample(self, hosts):
+        out, missing = {}, []
+        for name, fip in hosts:
+            r = self.fleet.batch.pop((name, fip), None)
+            if r is None:
+                missing.append((name, fip))
+            else:
+                out[name] = r
+        if missing:
+            out.update(super().sample(missing))
+        return out
+
+# ------------------------
+# Daemon
+# ------------------------
+def start_groups(conn, inv, groups, fleet, registry, daemon, shared):
+    """Crea un ReplicaSet per gruppo; i gruppi senza VM o senza FIP sono saltati.
+
+    `shared`: ControllerMetrics senza label di gruppo, per le risorse condivise (API, FIP pool).
+    """
+    contexts = {}           # (keypair, pubkey) -> DeployContext condiviso
+    out = []
+    for name, args in groups:
+        err = aw.check_args(args)
+        if err:
+            raise ValueError(f"[{name}] {err}")
+        # con --stream il gruppo usa i propri stream in-guest, fuori dal gather condiviso
+        rs = ReplicaSet(conn, args, inv, sampler=None if args.stream else fleet.view(args.ssh_key_path),
+                        metrics=ControllerMetrics(registry, group=name))
+        if args.event_log:
+            rs.on_event = aw.EventLog(args.event_log, name)
+        replicas = rs.replicas()
+        if not replicas:
+            print(f"[!] Gruppo '{name}': VM '{args.server}' non trovata (né suoi cloni), gruppo ignorato")
+            continue
+        if not rs.hosts(replicas):
+            print(f"[!] Gruppo '{name}': nessun Floating IP associato, gruppo ignorato")
+            continue
+        key = (args.deploy_keypair, args.deploy_pubkey_file)
+        rs.ctx = contexts.get(key)
+        ctx = contexts[key] = rs.ensure_context()
+        if daemon["fip_pool"] > 0 and ctx.fip_pool is None:
+            ctx.fip_pool = deployer.FipPool(conn, size=daemon["fip_pool"])
+            # il pool serve tutti i gruppi: la latenza di attach va sulla serie senza label di gruppo
+            ctx.fip_pool.on_attach = shared.fip_attach.observe
+            ctx.fip_pool.start()
+            print(f"[pool] FIP pool condiviso attivo: {daemon['fip_pool']} Floating IP pre-allocati")
+        if args.warm_pool > 0:
+            aw.start_warm_pool(rs, inv)
+        print(f"[i] Gruppo '{name}': repliche={[r.name for r in replicas]} — metric={args.metric}, "
+              f"HIGH={args.high:.1f}%, LOW={args.low:.1f}%, repliche {args.min_replicas}..{args.max_replicas}, "
+              f"interval={args.interval}s")
+        out.append((name, rs))
+    return out
+
+def run(groups, fleet, clock=time):
+    """Loop del daemon: a ogni giro campiona insieme i gruppi in scadenza, poi esegue i loro tick."""
+    due = {name: clock.monotonic() for name, _ in groups}
+    while True:
+        now = clock.monotonic()
+        ready = [(name, rs) for name, rs in groups if due[name] <= now]
+        jobs = []
+        for name, rs in ready:
+            if rs.args.stream:
+                continue
+            try:
+                jobs += [(h, fip, rs.args.ssh_key_path) for h, fip in rs.hosts(rs.replicas())]
+            except Exception as e:
+                print(f"[!] Gruppo '{name}': discovery fallita: {e}")
+        fleet.prefetch(jobs)
+        for name, rs in ready:
+            print(f"[*] Gruppo '{name}'")
+            rs.run_once()
+            due[name] = max(due[name] + rs.args.interval, clock.monotonic())
+        clock.sleep(max(0.0, min(due.values()) - clock.monotonic()))
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--config", required=True, help="File INI dei gruppi")
+    ap.add_argument("--check", action="store_true", help="Valida la configurazione ed esci")
+    args = ap.parse_args()
+    try:
+        daemon, groups = load_config(args.config)
+    except ValueError as e:
+        print(f"[!] {e}", file=sys.stderr); sys.exit(2)
+    if args.check:
+        # stessi vincoli applicati all'avvio del daemon (start_groups)
+        errors = [f"[{name}] {err}" for name, g in groups for err in [aw.check_args(g)] if err]
+        if errors:
+            for e in errors:
+                print(f"[!] {e}", file=sys.stderr)
+            sys.exit(2)
+        for name, g in groups:
+            print(f"[+] {name}: server={g.server} high={g.high} low={g.low} metric={g.metric} "
+                  f"repliche {g.min_replicas}..{g.max_replicas} interval={g.interval}s")
+        return
+
+    registry = Registry()
+    shared = ControllerMetrics(registry)
+    conn = InstrumentedConnection(deployer.connect(daemon["cloud"]), shared)
+    inv = ServerInventory(conn, ttl=daemon["inventory_ttl"], full_every=daemon["inventory_full_every"])
+    fleet = FleetSampler()
+    try:
+        active = start_groups(conn, inv, groups, fleet, registry, daemon, shared)
+    except ValueError as e:
+        print(f"[!] {e}", file=sys.stderr); sys.exit(2)
+    if not active:
+        print("[!] Nessun gruppo avviabile", file=sys.stderr); sys.exit(1)
+
+    if daemon["metrics_port"]:
+        serve_metrics(registry, daemon["metrics_port"], daemon["metrics_addr"])
+        print(f"[i] Metriche esposte su http://{daemon['metrics_addr']}:{daemon['metrics_port']}/metrics")
+
+    print(f"[*] Autoscaler multi-gruppo avviato: {len(active)} gruppi")
+    try:
+        run(active, fleet)
+    except KeyboardInterrupt:
+        print("[+] Autoscaler interrotto dall’utente, uscita pulita.")
+    finally:
+        for _, rs in active:
+            rs.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+# Strumentazione del controller: metriche in formato Prometheus/OpenMetrics, solo stdlib
+import threading, time, types
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Bucket (s) pensati per i percorsi del controller: da RTT SSH (~10 ms) a un cold path (minuti)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+
+def _fmt(v):
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v))
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    esc = lambda s: str(s).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+    return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in pairs) + "}"
+
+# ------------------------
+# Tipi di metrica
+# ------------------------
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, labelnames=(), const=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.const = tuple(const)   # label fisse [(nome, valore)], es. il gruppo nel daemon multi-gruppo
+        self.lock = threading.Lock()
+        self.values = {}        # tuple(label values) -> valore
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name}: label attese {self.labelnames}, ricevute {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def remove(self, **labels):
+        with self.lock:
+            self.values.pop(self._key(labels), None)
+
+    def clear(self):
+        with self.lock:
+            self.values.clear()
+
+    def header(self, openmetrics=False):
+        name = self.name
+        if openmetrics and self.kind == "counter" and name.endswith("_total"):
+            name = name[:-len("_total")]        # in OpenMetrics la famiglia è senza _total
+        return [f"# HELP {name} {self.help}", f"# TYPE {name} {self.kind}"]
+
+    def samples(self):
+        with self.lock:
+            items = sorted(self.values.items())
+        return self._samples(items)
+
+    def render(self, openmetrics=False):
+        return self.header(openmetrics) + self.samples()
+
+    def _samples(self, items):
+        return [f"{self.name}{_labels(self.labelnames, k, self.const)} {_fmt(v)}" for k, v in items]
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        with self.lock:
+            self.values[self._key(labels)] = value
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1.0, **labels):
+        with self.lock:
+            k = self._key(labels)
+            self.values[k] = self.values.get(k, 0.0) + amount
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS, const=()):
+        super().__init__(name, help, labelnames, const)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value, **labels):
+        with self.lock:
+            k = self._key(labels)
+            st = self.values.get(k)
+            if st is None:
+                st = self.values[k] = [[0] * len(self.buckets), 0.0, 0]
+            for i, b in enumerate(self.buckets):
+                if value <= b:
+                    st[0][i] += 1
+                    break
+            st[1] += value; st[2] += 1
+
+    @contextmanager
+    def time(self, clock=time, **labels):
+        t0 = clock.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(clock.monotonic() - t0, **labels)
+
+    def _samples(self, items):
+        out = []
+        for k, (counts, total, n) in items:
+            acc = 0
+            for b, c in zip(self.buckets, counts):
+                acc += c
+                out.append(f"{self.name}_bucket{_labels(self.labelnames, k, self.const + (('le', _fmt(b)),))} {acc}")
+            out.append(f"{self.name}_sum{_labels(self.labelnames, k, self.const)} {_fmt(total)}")
+            out.append(f"{self.name}_count{_labels(self.labelnames, k, self.const)} {n}")
+        return out
+
+class Registry:
+    """Metriche esportate. Più metriche con lo stesso nome (label fisse diverse) formano una sola famiglia."""
+
+    def __init__(self, const=()):
+        self.metrics = []
+        self.const = tuple(const)
+
+    def _add(self, m):
+        self.metrics.append(m)
+        return m
+
+    def labeled(self, **labels):
+        """Vista del registry che aggiunge `labels` a ogni metrica creata (es. group=...)."""
+        view = Registry(self.const + tuple(labels.items()))
+        view.metrics = self.metrics
+        return view
+
+    def gauge(self, name, help, labelnames=()):
+        return self._add(Gauge(name, help, labelnames, self.const))
+
+    def counter(self, name, help, labelnames=()):
+        return self._add(Counter(name, help, labelnames, self.const))
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(name, help, labelnames, buckets, self.const))
+
+    def render(self, openmetrics=False):
+        families = {}
+        for m in self.metrics:
+            families.setdefault(m.name, []).append(m)
+        lines = []
+        for ms in families.values():
+            lines += ms[0].header(openmetrics)
+            for m in ms:
+                lines += m.samples()
+        if openmetrics:
+            lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+# ------------------------
+# Endpoint HTTP (/metrics)
+# ------------------------
+PROM_CT = "text/plain; version=0.0.4; charset=utf-8"
+OPENMETRICS_CT = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+def serve(registry, port, addr="0.0.0.0"):
+    """Avvia /metrics su un thread daemon; ritorna il server (server.shutdown() per fermarlo)."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/metrics", "/"):
+                self.send_error(404); return
+            om = "application/openmetrics-text" in self.headers.get("Accept", "")
+            body = registry.render(openmetrics=om).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", OPENMETRICS_CT if om else PROM_CT)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *a):
+            pass        # niente access log mescolato ai log del controller
+
+    srv = ThreadingHTTPServer((addr, port), Handler)
+    srv.daemon_threads = True
+    threading.Thread(target=srv.serve_forever, name="metrics-http", daemon=True).start()
+    return srv
+
+# ------------------------
+# Metriche del controller
+# ------------------------
+class ControllerMetrics:
+    """Tutte le metriche di autoscale_watch.py in un registry (uno per controller)."""
+
+    def __init__(self, registry=None, **labels):
+        self.registry = registry or Registry()
+        r = self.registry.labeled(**labels) if labels else self.registry
+        self.host_cpu = r.gauge("autoscale_host_cpu_percent", "CPU usata nell'ultimo campione", ["host"])
+        self.host_mem = r.gauge("autoscale_host_mem_percent", "RAM usata nell'ultimo campione", ["host"])
+        self.host_cpu_mode = r.gauge("autoscale_host_cpu_mode_percent",
+                                     "CPU per modo (user/system/iowait/steal), ultimo punto dello stream",
+                                     ["host", "mode"])
+        self.fleet_value = r.gauge("autoscale_fleet_value_percent", "Aggregato di flotta usato per le decisioni")
+        self.replicas = r.gauge("autoscale_replicas", "Repliche del gruppo per stato", ["state"])
+        self.ssh_sample = r.histogram("autoscale_ssh_sample_seconds",
+                                      "Durata di un campione SSH (round-trip + finestra CPU di 1 s)")
+        self.ssh_failures = r.counter("autoscale_ssh_failures_total", "Campionamenti SSH falliti")
+        self.stream_samples = r.counter("autoscale_stream_samples_total", "Punti ricevuti dagli stream in-guest")
+        self.stream_dropped = r.counter("autoscale_stream_dropped_samples_total",
+                                        "Punti degli stream persi (gap oltre un intervallo, righe malformate)")
+        self.stream_reconnects = r.counter("autoscale_stream_reconnects_total", "Sessioni di stream riaperte")
+        self.stream_age = r.gauge("autoscale_stream_age_seconds", "Età dell'ultimo punto dello stream al tick",
+                                  ["host"])
+        self.api = r.histogram("autoscale_openstack_api_seconds", "Latenza delle chiamate OpenStack SDK",
+                               ["service", "call"])
+        self.api_errors = r.counter("autoscale_openstack_api_errors_total", "Chiamate OpenStack fallite",
+                                    ["service", "call"])
+        self.discovery = r.histogram("autoscale_discovery_seconds",
+                                     "Tempo per elencare base + cloni (inventario incluso)")
+        self.actions = r.histogram("autoscale_scale_action_seconds", "Durata delle azioni di scaling",
+                                   ["kind", "state"])
+        self.fip_attach = r.histogram("autoscale_fip_attach_seconds",
+                                      "Da VM ACTIVE a Floating IP associato (con --fip-pool)")
+        self.promotions = r.histogram("autoscale_warm_promotion_seconds", "Durata di una promozione da warm pool")
+        self.decisions = r.counter("autoscale_decisions_total", "Decisioni di scaling prese", ["direction"])
+        self.tick = r.histogram("autoscale_tick_seconds", "Durata di un ciclo di controllo")
+        self.tick_lag = r.gauge("autoscale_tick_lag_seconds",
+                                "Ritardo dell'ultimo ciclo rispetto a --interval (0 = in orario)")
+        self.tick_overruns = r.counter("autoscale_tick_overruns_total", "Cicli più lunghi di --interval")
+        self.tick_errors = r.counter("autoscale_tick_errors_total", "Cicli terminati con un'eccezione")
+        self.last_tick = r.gauge("autoscale_last_tick_timestamp_seconds", "Unix time della fine dell'ultimo ciclo")
+
+    def forget_host(self, host):
+        self.host_cpu.remove(host=host); self.host_mem.remove(host=host); self.stream_age.remove(host=host)
+        for mode in ("user", "system", "iowait", "steal"):
+            self.host_cpu_mode.remove(host=host, mode=mode)
+
+# ------------------------
+# Connessione OpenStack strumentata
+# ------------------------
+class _TimedProxy:
+    def __init__(self, target, service, hist, errors):
+        self._target = target
+        self._service = service
+        self._hist = hist
+        self._errors = errors
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        # wait_* sono attese lato client, non latenze API
+        if not callable(attr) or name.startswith(("_", "wait_")):
+            return attr
+        labels = {"service": self._service, "call": name}
+
+        def call(*a, **kw):
+            t0 = time.monotonic()
+            try:
+                res = attr(*a, **kw)
+            except Exception:
+                self._errors.inc(**labels)
+                raise
+            if isinstance(res, types.GeneratorType):
+                return self._timed_iter(res, t0, labels)     # le list dell'SDK sono lazy: misura fino all'ultima pagina
+            self._hist.observe(time.monotonic() - t0, **labels)
+            return res
+        return call
+
+    def _timed_iter(self, gen, t0, labels):
+        try:
+            yield from gen
+        except Exception:
+            self._errors.inc(**labels)
+            raise
+        finally:
+            self._hist.observe(time.monotonic() - t0, **labels)
+
+class InstrumentedConnection:
+    """Avvolge una openstack.connection.Connection misurando compute/network/image."""
+    SERVICES = ("compute", "network", "image")
+
+    def __init__(self, conn, metrics):
+        self._conn = conn
+        for svc in self.SERVICES:
+            setattr(self, svc, _TimedProxy(getattr(conn, svc), svc, metrics.api, metrics.api_errors))
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+# Storico metriche a memoria costante + policy di decisione per autoscale_watch.py
+import math
+from array import array
+
+# ------------------------
+# Ring buffer per host/metrica
+# ------------------------
+class MetricRing:
+    """Serie temporale a dimensione fissa su `array('d')`: memoria costante, niente liste che crescono."""
+
+    def __init__(self, size=120):
+        self.size = size
+        self.times = array("d", [0.0]) * size
+        self.values = array("d", [0.0]) * size
+        self.head = 0           # prossima posizione da scrivere
+        self.count = 0
+
+    def append(self, t, value):
+        self.times[self.head] = t
+        self.values[self.head] = value
+        self.head = (self.head + 1) % self.size
+        self.count = min(self.count + 1, self.size)
+
+    def __len__(self):
+        return self.count
+
+    def series(self, window=None, since=None):
+        """(tempi, valori) in ordine cronologico: ultimi `window` punti, solo con t > since."""
+        n = self.count if window is None else min(window, self.count)
+        start = (self.head - n) % self.size
+        idx = [(start + i) % self.size for i in range(n)]
+        ts = [self.times[i] for i in idx]
+        vs = [self.values[i] for i in idx]
+        if since is not None:
+            keep = [k for k, t in enumerate(ts) if t > since]
+            ts = [ts[k] for k in keep]; vs = [vs[k] for k in keep]
+        return ts, vs
+
+    def last(self):
+        if not self.count:
+            return None
+        return self.values[(self.head - 1) % self.size]
+
+def ewma(values, alpha=0.3):
+    acc = None
+    for v in values:
+        acc = v if acc is None else alpha * v + (1 - alpha) * acc
+    return acc
+
+def percentile(values, q):
+    """Percentile con interpolazione lineare (q in [0, 100])."""
+    vals = sorted(values)
+    if not vals:
+        return 0.0
+    k = (len(vals) - 1) * q / 100.0
+    lo = math.floor(k); hi = math.ceil(k)
+    return vals[lo] + (vals[hi] - vals[lo]) * (k - lo)
+
+def slope(times, values):
+    """Pendenza ai minimi quadrati (unità/s); 0 se i punti non bastano."""
+    n = len(values)
+    if n < 2:
+        return 0.0
+    mt = sum(times) / n; mv = sum(values) / n
+    den = sum((t - mt) ** 2 for t in times)
+    if den == 0:
+        return 0.0
+    return sum((t - mt) * (v - mv) for t, v in zip(times, values)) / den
+
+def window_stats(ring, window=None, since=None, alpha=0.3):
+    ts, vs = ring.series(window, since)
+    if not vs:
+        return None
+    return {"n": len(vs), "last": vs[-1], "ewma": ewma(vs, alpha), "p50": percentile(vs, 50),
+            "p95": percentile(vs, 95), "slope": slope(ts, vs)}
+
+class MetricHistory:
+    """Un MetricRing per (host, metrica). `FLEET` è la serie dell'aggregato di flotta."""
+    FLEET = "__fleet__"
+
+    def __init__(self, size=120):
+        self.size = size
+        self.rings = {}
+
+    def ring(self, host, metric):
+        key = (host, metric)
+        if key not in self.rings:
+            self.rings[key] = MetricRing(self.size)
+        return self.rings[key]
+
+    def record(self, host, t, **metrics):
+        for metric, value in metrics.items():
+            self.ring(host, metric).append(t, value)
+
+    def forget(self, host):
+        """Libera le serie di un host rimosso (la memoria resta proporzionale alla flotta)."""
+        for key in [k for k in self.rings if k[0] == host]:
+            del self.rings[key]
+
+    def prune(self, keep):
+        """Tiene solo gli host in `keep` (più la serie di flotta)."""
+        for host in {k[0] for k in self.rings} - set(keep) - {self.FLEET}:
+            self.forget(host)
+
+# ------------------------
+# Policy di decisione
+# ------------------------
+class Policy:
+    """Interfaccia: decide(ring, now) -> "up" | "down" | None.
+
+    Dopo ogni azione il controller chiama reset(now): i campioni precedenti
+    non contano più (equivale all'azzeramento dei contatori legacy).
+    """
+
+    def __init__(self, high, low, min_up=4, min_down=4, window=12, alpha=0.3):
+        self.high = high; self.low = low
+        self.min_up = min_up; self.min_down = min_down
+        self.window = max(window, min_up, min_down)
+        self.alpha = alpha
+        self.since = None
+        self.stats = None       # ultime statistiche calcolate (per i log)
+
+    def reset(self, now):
+        self.since = now
+
+    def decide(self, ring, now):
+        self.stats = window_stats(ring, self.window, self.since, self.alpha)
+        if not self.stats:
+            return None
+        return self._decide(ring, self.stats)
+
+    def _decide(self, ring, stats):
+        raise NotImplementedError
+
+class HitsPolicy(Policy):
+    """Comportamento storico: --min-up/--min-down campioni consecutivi oltre soglia."""
+
+    def _decide(self, ring, stats):
+        _, up = ring.series(self.min_up, self.since)
+        if len(up) >= self.min_up and all(v >= self.high for v in up):
+            return "up"
+        _, down = ring.series(self.min_down, self.since)
+        if len(down) >= self.min_down and all(v <= self.low for v in down):
+            return "down"
+        return None
+
+class EwmaPolicy(Policy):
+    """Media mobile esponenziale sulla finestra: un campione isolato nella banda non azzera nulla."""
+
+    def _decide(self, ring, stats):
+        if stats["n"] >= self.min_up and stats["ewma"] >= self.high:
+            return "up"
+        if stats["n"] >= self.min_down and stats["ewma"] <= self.low:
+            return "down"
+        return None
+
+class PercentilePolicy(Policy):
+    """Scale-up se la mediana della finestra è sopra HIGH (carico che oscilla attorno alla soglia),
+    scale-down solo se anche il p95 è sotto LOW (niente flapping sui picchi brevi)."""
+
+    def _decide(self, ring, stats):
+        if stats["n"] >= self.min_up and stats["p50"] >= self.high:
+            return "up"
+        if stats["n"] >= self.min_down and stats["p95"] <= self.low:
+            return "down"
+        return None
+
+POLICIES = {"hits": HitsPolicy, "ewma": EwmaPolicy, "percentile": PercentilePolicy}
+
+# ------------------------
+# Previsione del trend (scale-out predittivo)
+# ------------------------
+def linear_trend(times, values):
+    """(valore stimato all'ultimo istante, pendenza/s) dalla retta ai minimi quadrati."""
+    m = slope(times, values)
+    mt = sum(times) / len(times); mv = sum(values) / len(values)
+    return mv + m * (times[-1] - mt), m
+
+def holt_trend(times, values, alpha=0.5, beta=0.3):
+    """(livello, trend/s) con lo smoothing esponenziale doppio di Holt (campioni ~equispaziati)."""
+    if len(values) < 2:
+        return values[-1], 0.0
+    step = (times[-1] - times[0]) / (len(times) - 1) or 1.0
+    level, trend = values[0], values[1] - values[0]
+    for v in values[1:]:
+        prev = level
+        level = alpha * v + (1 - alpha) * (level + trend)
+        trend = beta * (level - prev) + (1 - beta) * trend
+    return level, trend / step
+
+FORECASTERS = {"linear": linear_trend, "holt": holt_trend}
+
+def time_to_cross(level, rate, threshold):
+    """Secondi prima che level + rate*t raggiunga threshold (None se non ci arriva)."""
+    if level >= threshold:
+        return 0.0
+    if rate <= 0:
+        return None
+    return (threshold - level) / rate
+
+class PredictivePolicy(Policy):
+    """Avvolge un'altra policy e anticipa lo scale-up quando il trend previsto
+    supera HIGH entro il lead time di provisioning (`lead_time()` secondi).
+
+    Con dry_run la previsione viene solo loggata, insieme al crossing reale
+    (o alla sua assenza) per misurarne l'errore.
+    """
+
+    def __init__(self, inner, method="linear", lead_time=lambda: 120.0, dry_run=False, min_points=4):
+        super().__init__(inner.high, inner.low, inner.min_up, inner.min_down, inner.window, inner.alpha)
+        self.inner = inner
+        self.method = method
+        self.lead_time = lead_time
+        self.dry_run = dry_run
+        self.min_points = min_points
+        self.prediction = None      # (istante previsione, crossing previsto)
+        self.forecast = None        # (ttc, lead) dell'ultima valutazione, per i log
+
+    def reset(self, now):
+        super().reset(now)
+        self.inner.reset(now)
+
+    def _track(self, vs, now, lead):
+        if not self.prediction:
+            return
+        made, predicted = self.prediction
+        if vs and vs[-1] >= self.high:
+            print(f"[predict] crossing reale di HIGH: previsto {predicted - made:.0f}s dopo la previsione, "
+                  f"avvenuto dopo {now - made:.0f}s (errore {now - predicted:+.0f}s)")
+            self.prediction = None
+        elif now > predicted + lead:
+            print(f"[predict] nessun crossing entro {now - made:.0f}s dalla previsione "
+                  f"({'falso positivo' if self.dry_run else 'scale-out anticipato o falso positivo'})")
+            self.prediction = None
+
+    def decide(self, ring, now):
+        decision = self.inner.decide(ring, now)
+        self.stats = self.inner.stats
+        ts, vs = ring.series(self.window, self.since)
+        lead = self.lead_time()
+        self._track(vs, now, lead)
+        self.forecast = None
+        if decision or len(vs) < self.min_points or vs[-1] >= self.high:
+            return decision
+        level, rate = FORECASTERS[self.method](ts, vs)
+        ttc = time_to_cross(level, rate, self.high)
+        self.forecast = (ttc, lead)
+        if ttc is None or ttc > lead:
+            return decision
+        if not self.prediction:
+            self.prediction = (now, now + ttc)
+            print(f"[predict] {self.method}: HIGH={self.high:.0f}% previsto tra {ttc:.0f}s "
+                  f"(lead time {lead:.0f}s, trend {rate:+.2f}%/s)" + (" [dry-run]" if self.dry_run else ""))
+        return None if self.dry_run else "up"
+
+def build_policy(name, **kw):
+    return POLICIES[name](**kw)
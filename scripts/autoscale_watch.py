@@ -1,30 +1,117 @@
 #!/usr/bin/env python3
-import argparse, os, sys, time, subprocess, re
-from openstack import connection
+import argparse, json, os, sys, time, subprocess, re, asyncio, threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# deploy_secure_vm.py viene importato come libreria: prima dalla root del repo,
+# poi da $HOME (dove il README suggerisce di copiarlo).
+for _d in (os.environ.get("AUTOSCALE_DEPLOYER_DIR"),
+           os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+           os.path.expanduser("~")):
+    if _d and _d not in sys.path:
+        sys.path.append(_d)
+import deploy_secure_vm as deployer
+from autoscale_policy import (MetricHistory, POLICIES, FORECASTERS, PredictivePolicy, build_policy,
+                              percentile)
+from autoscale_metrics import ControllerMetrics, InstrumentedConnection, serve as serve_metrics
+
+# ------------------------
+# Inventario server (cache condivisa)
+# ------------------------
+def _floating_ip(addresses):
+    for lst in (addresses or {}).values():
+        for it in lst:
+            if it.get("OS-EXT-IPS:type") == "floating":
+                return it.get("addr")
+    return None
+
+class ServerInventory:
+    """Cache dei server del tenant (nome, stato, FIP) condivisa da discovery, cloni e handover.
+
+    Un listing dettagliato completo ogni `full_every` secondi; nel mezzo solo
+    refresh incrementali con `changes-since` (watermark = max `updated` visto
+    da Nova, quindi senza problemi di clock skew). Nessun refresh prima di `ttl`.
+    """
+
+    def __init__(self, conn, ttl=5.0, full_every=300.0, clock=time):
+        self.conn = conn
+        self.ttl = ttl
+        self.full_every = full_every
+        self.clock = clock
+        self.servers = {}        # id -> server (listing dettagliato, con addresses)
+        self.known_fips = {}     # id -> FIP noto dal provisioning (Nova può non aver ancora aggiornato addresses)
+        self.deleting = set()    # id di server di cui abbiamo chiesto la cancellazione
+        self.watermark = None    # max updated_at visto
+        self.last_refresh = self.last_full = None
+
+    def refresh(self, force=False):
+        now = self.clock.monotonic()
+        if not force and self.last_refresh is not None and now - self.last_refresh < self.ttl:
+            return
+        full = (self.watermark is None or self.last_full is None
+                or now - self.last_full >= self.full_every)
+        if full:
+            seen = {}
+            for srv in self.conn.compute.servers(details=True):
+                seen[srv.id] = srv
+            self.servers = seen
+            self.deleting &= set(seen)
+            self.known_fips = {k: v for k, v in self.known_fips.items() if k in seen}
+            self.last_full = now
+        else:
+            for srv in self.conn.compute.servers(details=True, changes_since=self.watermark):
+                self._apply(srv)
+        for srv in self.servers.values():
+            upd = getattr(srv, "updated_at", None)
+            if upd and (self.watermark is None or upd > self.watermark):
+                self.watermark = upd
+        self.last_refresh = now
+
+    def _apply(self, srv):
+        if getattr(srv, "status", "").upper() in ("DELETED", "SOFT_DELETED"):
+            self.servers.pop(srv.id, None); self.deleting.discard(srv.id); self.known_fips.pop(srv.id, None)
+        else:
+            self.servers[srv.id] = srv
+
+    def upsert(self, srv, fip=None):
+        """Registra subito un server appena creato (senza aspettare il prossimo refresh)."""
+        self.servers[srv.id] = srv
+        if fip:
+            self.known_fips[srv.id] = fip
+
+    def forget(self, server_id):
+        """Nasconde un server di cui è stata chiesta la cancellazione."""
+        self.deleting.add(server_id)
+
+    def restore(self, srv):
+        """Annulla forget(): la cancellazione è fallita o è stata annullata, il server è ancora vivo."""
+        self.deleting.discard(srv.id)
+        self.servers.setdefault(srv.id, srv)
+
+    def list(self):
+        return [s for sid, s in self.servers.items() if sid not in self.deleting]
+
+    def find(self, name):
+        for s in self.list():
+            if s.name == name:
+                return s
+        return None
+
+    def fip(self, server):
+        cur = self.servers.get(server.id, server)
+        return _floating_ip(getattr(cur, "addresses", None)) or self.known_fips.get(server.id)
 
 # ------------------------
 # Utility di discovery VMs
 # ------------------------
-def _list_active_with_fip(conn):
-    items = []
-    for s in conn.compute.servers():
-        try:
-            if getattr(s, "status", "").upper() != "ACTIVE":
-                continue
-            det = conn.compute.get_server(s.id)
-            fip = None
-            for lst in (det.addresses or {}).values():
-                for it in lst:
-                    if it.get("OS-EXT-IPS:type") == "floating":
-                        fip = it.get("addr"); break
-            items.append((s.name, fip))
-        except Exception:
-            pass
+def _list_active_with_fip(inv):
+    inv.refresh()
+    items = [(s.name, inv.fip(s)) for s in inv.list() if getattr(s, "status", "").upper() == "ACTIVE"]
     items.sort(key=lambda t: t[0])
     return items
 
-def _choose_server_interactive(conn):
-    items = _list_active_with_fip(conn)
+def _choose_server_interactive(inv):
+    items = _list_active_with_fip(inv)
     if not items:
         print("[!] Nessuna istanza ACTIVE trovata.", file=sys.stderr)
         sys.exit(1)
@@ -43,27 +130,47 @@ def _choose_server_interactive(conn):
 # ------------------------
 # SSH & metriche
 # ------------------------
-def ssh_run(host, cmd, key_path, timeout=5):
-    opts = [
+# Sessione SSH persistente per host (ControlMaster): il primo comando apre il
+# master, i successivi riusano il canale senza rifare handshake/key-exchange.
+SSH_CONTROL_DIR = os.environ.get("AUTOSCALE_SSH_CONTROL_DIR", "/tmp")
+SSH_CONTROL_PERSIST = os.environ.get("AUTOSCALE_SSH_CONTROL_PERSIST", "120")
+
+def _ssh_opts(host, key_path):
+    return [
         "ssh","-o","StrictHostKeyChecking=no",
         "-o","IdentitiesOnly=yes",
         "-o","BatchMode=yes",
         "-o","PubkeyAuthentication=yes",
         "-o","PubkeyAcceptedAlgorithms=+ssh-rsa",
         "-o","HostKeyAlgorithms=+ssh-rsa",
+        "-o","ControlMaster=auto",
+        "-o",f"ControlPath={os.path.join(SSH_CONTROL_DIR, 'autoscale-ssh-%r@%h:%p')}",
+        "-o",f"ControlPersist={SSH_CONTROL_PERSIST}",
         "-i", os.path.expanduser(key_path),
-        f"cirros@{host}", cmd
+        f"cirros@{host}",
     ]
-    cp = subprocess.run(opts, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+
+def ssh_run(host, cmd, key_path, timeout=5):
+    cp = subprocess.run(_ssh_opts(host, key_path) + [cmd], stdout=subprocess.PIPE, stderr=subprocess.PIPE,
                         timeout=timeout, text=True)
     if cp.returncode != 0:
         raise RuntimeError(f"SSH failed: {cp.stderr.strip()}")
     return cp.stdout.strip()
 
-def get_metrics(host, key_path):
-    a = ssh_run(host, "grep '^cpu ' /proc/stat", key_path)
-    time.sleep(1)
-    b = ssh_run(host, "grep '^cpu ' /proc/stat", key_path)
+def ssh_close(host, key_path):
+    """Chiude il master SSH persistente verso host (se aperto)."""
+    opts = _ssh_opts(host, key_path)
+    subprocess.run(opts[:-1] + ["-O", "exit", opts[-1]], stdout=subprocess.DEVNULL,
+                   stderr=subprocess.DEVNULL, timeout=5)
+
+# Un solo round-trip: due snapshot di /proc/stat a distanza di `window` secondi + meminfo.
+SAMPLE_CMD = ("grep '^cpu ' /proc/stat; sleep {window}; grep '^cpu ' /proc/stat; "
+              "egrep 'MemTotal|MemAvailable' /proc/meminfo")
+
+def _parse_sample(out):
+    cpu_lines = [l for l in out.splitlines() if l.startswith("cpu ")]
+    if len(cpu_lines) != 2:
+        raise RuntimeError(f"Output /proc/stat inatteso: {out!r}")
 
     def parse(line):
         parts = line.split()
@@ -72,17 +179,250 @@ def get_metrics(host, key_path):
         total = sum(vals)
         return total, idle
 
-    t1, i1 = parse(a); t2, i2 = parse(b)
+    t1, i1 = parse(cpu_lines[0]); t2, i2 = parse(cpu_lines[1])
     dt = t2 - t1; di = i2 - i1
     cpu_busy = (1 - (di/dt)) * 100 if dt > 0 else 0.0
 
-    mem = ssh_run(host, "cat /proc/meminfo | egrep 'MemTotal|MemAvailable'", key_path)
-    lines = {l.split(':')[0]: int(l.split()[1]) for l in mem.splitlines()}
+    lines = {l.split(':')[0]: int(l.split()[1]) for l in out.splitlines() if l.startswith("Mem")}
     mem_total = lines["MemTotal"]; mem_avail = lines["MemAvailable"]
     mem_used_pct = (1 - (mem_avail/mem_total)) * 100
 
     return cpu_busy, mem_used_pct
 
+def get_metrics(host, key_path, window=1):
+    """Ritorna (cpu%, mem%, durata_campione_s) con un solo comando remoto."""
+    t0 = time.monotonic()
+    out = ssh_run(host, SAMPLE_CMD.format(window=window), key_path, timeout=window + 5)
+    cpu_busy, mem_used_pct = _parse_sample(out)
+    return cpu_busy, mem_used_pct, time.monotonic() - t0
+
+# ------------------------
+# Campionamento concorrente della flotta (base + cloni)
+# ------------------------
+async def ssh_run_async(host, cmd, key_path, timeout=5):
+    proc = await asyncio.create_subprocess_exec(*_ssh_opts(host, key_path), cmd,
+                                                stdout=asyncio.subprocess.PIPE,
+                                                stderr=asyncio.subprocess.PIPE)
+    try:
+        out, err = await asyncio.wait_for(proc.communicate(), timeout)
+    except asyncio.TimeoutError:
+        proc.kill(); await proc.wait()
+        raise RuntimeError(f"SSH timeout verso {host}")
+    if proc.returncode != 0:
+        raise RuntimeError(f"SSH failed: {err.decode(errors='replace').strip()}")
+    return out.decode(errors="replace").strip()
+
+async def get_metrics_async(host, key_path, window=1):
+    t0 = time.monotonic()
+    out = await ssh_run_async(host, SAMPLE_CMD.format(window=window), key_path, timeout=window + 5)
+    cpu_busy, mem_used_pct = _parse_sample(out)
+    return cpu_busy, mem_used_pct, time.monotonic() - t0
+
+async def _sample_fleet_async(hosts, key_path, window):
+    res = await asyncio.gather(*(get_metrics_async(fip, key_path, window) for _, fip in hosts),
+                               return_exceptions=True)
+    return {name: r for (name, _), r in zip(hosts, res)}
+
+def sample_fleet(hosts, key_path, window=1):
+    """Campiona in parallelo [(nome, fip)] -> {nome: (cpu, mem, durata) | Exception}."""
+    if not hosts:
+        return {}
+    return asyncio.run(_sample_fleet_async(hosts, key_path, window))
+
+def _metric_value(metric, cpu, mem):
+    return cpu if metric == "cpu" else mem if metric == "mem" else max(cpu, mem)
+
+def fleet_stats(values):
+    return {"mean": sum(values) / len(values), "max": max(values), "p95": percentile(values, 95)}
+
+class SshSampler:
+    """Sorgente metriche del controller: SSH verso i guest (sessioni persistenti).
+
+    Il controller usa solo sample(hosts) e close(host): il simulatore ne
+    fornisce una sintetica con la stessa interfaccia.
+    """
+
+    def __init__(self, key_path, window=1):
+        self.key_path = key_path
+        self.window = window
+
+    def sample(self, hosts):
+        return sample_fleet(hosts, self.key_path, self.window)
+
+    def close(self, host):
+        try:
+            ssh_close(host, self.key_path)
+        except Exception:
+            pass
+
+# ------------------------
+# Streaming in-guest (--stream)
+# ------------------------
+# Campionatore BusyBox (ash): solo builtin + usleep/sleep, nessun fork per record.
+# Un record per riga: uptime user nice system idle iowait irq softirq steal MemTotal MemAvailable
+STREAM_CMD = ("S='sleep {sec}'; usleep 1 2>/dev/null && S='usleep {usec}'; "
+              "while :; do read c u ni sy id io irq si st r < /proc/stat; "
+              "while read k v r; do case $k in MemTotal:) mt=$v;; MemAvailable:) ma=$v; break;; esac; "
+              "done < /proc/meminfo; read up r < /proc/uptime; "
+              "echo \"$up $u $ni $sy $id $io $irq $si $st $mt $ma\" || exit; $S; done")
+
+class GuestStream:
+    """Stream di un host: sessione SSH di lunga durata col campionatore in-guest, riconnessa in background.
+
+    I record diventano punti (t, cpu%, mem%, {modo: %}) con t sull'orologio
+    del controller (uptime del guest + offset fissato al primo record di ogni
+    sessione). Gap tra punti più lunghi di un intervallo e righe malformate
+    contano come campioni persi.
+    """
+
+    def __init__(self, host, key_path, interval=0.25, metrics=None, clock=time, maxlen=2400):
+        self.host = host
+        self.key_path = key_path
+        self.interval = interval
+        self.metrics = metrics
+        self.clock = clock
+        self.points = deque(maxlen=maxlen)
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.proc = None
+        self.last_t = None          # t dell'ultimo punto prodotto (anche tra sessioni)
+        self.last_seen = clock.monotonic()
+        self.thread = threading.Thread(target=self._run, name=f"stream-{host}", daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        backoff = 1.0
+        while not self.stopped.is_set():
+            try:
+                if self._session():
+                    backoff = 1.0
+            except Exception as e:
+                print(f"[stream] {self.host}: {e}")
+            if self.stopped.is_set():
+                break
+            if self.metrics:
+                self.metrics.stream_reconnects.inc()
+            print(f"[stream] {self.host}: sessione chiusa, riconnessione tra {backoff:.0f}s")
+            self.stopped.wait(backoff)
+            backoff = min(backoff * 2, 30.0)
+
+    def _session(self):
+        """Una sessione SSH: legge record finché lo stream resta vivo; True se ha prodotto punti."""
+        cmd = STREAM_CMD.format(sec=self.interval, usec=int(self.interval * 1e6))
+        self.proc = subprocess.Popen(_ssh_opts(self.host, self.key_path) + [cmd], stdout=subprocess.PIPE,
+                                     stderr=subprocess.DEVNULL, text=True)
+        prev, offset, produced = None, None, False
+        try:
+            for line in iter(self.proc.stdout.readline, ""):
+                self.last_seen = self.clock.monotonic()
+                try:
+                    f = line.split()
+                    up, cpu = float(f[0]), [int(x) for x in f[1:9]]
+                    mem = (1 - int(f[10]) / int(f[9])) * 100
+                except (ValueError, IndexError, ZeroDivisionError):
+                    self._dropped(1)
+                    continue
+                if offset is None:
+                    offset = self.last_seen - up
+                if prev is not None:
+                    self._point(offset + up, prev, cpu, mem)
+                    produced = True
+                prev = cpu
+                if self.stopped.is_set():
+                    break
+        finally:
+            self.kick()
+        return produced
+
+    def _point(self, t, prev, cur, mem):
+        d = [b - a for a, b in zip(prev, cur)]
+        total = sum(d)
+        if total <= 0:
+            return
+        u, ni, sy, idle, io, irq, si, st = d
+        modes = {"user": (u + ni) / total * 100, "system": (sy + irq + si) / total * 100,
+                 "iowait": io / total * 100, "steal": st / total * 100}
+        cpu = (1 - (idle + io) / total) * 100
+        with self.lock:
+            if self.last_t is not None:
+                self._dropped(max(0, round((t - self.last_t) / self.interval) - 1))
+            self.last_t = t
+            self.points.append((t, cpu, mem, modes))
+        if self.metrics:
+            self.metrics.stream_samples.inc()
+
+    def _dropped(self, n):
+        if n and self.metrics:
+            self.metrics.stream_dropped.inc(n)
+
+    def drain(self):
+        """Punti arrivati dall'ultima chiamata."""
+        with self.lock:
+            out = list(self.points)
+            self.points.clear()
+        return out
+
+    def age(self):
+        return self.clock.monotonic() - self.last_seen
+
+    def kick(self):
+        """Chiude la sessione corrente: il thread si riconnette (se non fermato)."""
+        proc = self.proc
+        if proc and proc.poll() is None:
+            proc.kill()
+            proc.wait()
+
+    def stop(self):
+        self.stopped.set()
+        self.kick()
+
+class StreamSampler(SshSampler):
+    """Sorgente metriche in streaming: legge i buffer degli stream, non blocca il ciclo di controllo.
+
+    Un host senza punti nuovi (primo tick, riconnessione in corso) è
+    campionato una volta col percorso SSH classico. Uno stream muto da più di
+    `stale` secondi viene chiuso e riaperto.
+    """
+
+    def __init__(self, key_path, interval=0.25, stat="mean", metrics=None, clock=time, stale=None):
+        super().__init__(key_path)
+        self.interval = interval
+        self.stat = stat
+        self.metrics = metrics
+        self.clock = clock
+        self.stale = stale or max(3.0, 10 * interval)
+        self.streams = {}       # fip -> GuestStream
+
+    def sample(self, hosts):
+        out, missing = {}, []
+        for fip in [f for f in self.streams if f not in {fip for _, fip in hosts}]:
+            self.streams.pop(fip).stop()
+        for name, fip in hosts:
+            st = self.streams.get(fip)
+            if st is None:
+                st = self.streams[fip] = GuestStream(fip, self.key_path, self.interval, self.metrics, self.clock)
+            elif st.age() > self.stale:
+                print(f"[stream] {name}: nessun record da {st.age():.1f}s, riapro la sessione")
+                st.kick()
+            pts = st.drain()
+            if not pts:
+                missing.append((name, fip))
+                continue
+            cpu = fleet_stats([p[1] for p in pts])[self.stat]
+            age = self.clock.monotonic() - pts[-1][0]
+            if self.metrics:
+                self.metrics.stream_age.set(age, host=name)
+            out[name] = (cpu, pts[-1][2], age, pts)
+        if missing:
+            out.update(super().sample(missing))
+        return out
+
+    def close(self, host):
+        st = self.streams.pop(host, None)
+        if st:
+            st.stop()
+        super().close(host)
+
 # ------------------------
 # Cloni <base>_clone_#
 # ------------------------
@@ -93,11 +433,12 @@ def _is_clone_of(base_name: str, candidate: str) -> bool:
     pref = _clone_prefix(base_name)
     return candidate == pref or candidate.startswith(pref + "_")
 
-def _list_clones(conn, base_name: str):
+def _list_clones(inv, base_name: str):
     pref = _clone_prefix(base_name)
     out = []
     pattern = re.compile(rf"^{re.escape(pref)}_(\d+)$")
-    for s in conn.compute.servers():
+    inv.refresh()
+    for s in inv.list():
         try:
             nm = s.name or ""
             if not _is_clone_of(base_name, nm):
@@ -115,113 +456,722 @@ def _list_clones(conn, base_name: str):
 def _pick_primary_clone_name(base_name: str) -> str:
     return _clone_prefix(base_name)
 
-def _get_server_fip(conn, server_obj):
-    det = conn.compute.get_server(server_obj.id)
-    for lst in (det.addresses or {}).values():
-        for it in lst:
-            if it.get("OS-EXT-IPS:type") == "floating":
-                return it.get("addr")
-    return None
+def _next_clone_name(inv, group, reserved=()):
+    """Prossimo `<group>_clone_N` libero, saltando i nomi riservati da azioni in corso."""
+    pattern = re.compile(rf"^{re.escape(_clone_prefix(group))}_(\d+)$")
+    idx = [i for _, i in _list_clones(inv, group) if i is not None]
+    idx += [int(m.group(1)) for m in map(pattern.match, reserved) if m]
+    return f"{_clone_prefix(group)}_{max(idx) + 1 if idx else 1}"
+
+def wait_ssh_ready(host, key_path, timeout=180, poll=3):
+    """Attende che la VM risponda via SSH (apre anche il master persistente)."""
+    deadline = time.monotonic() + timeout
+    last = None
+    while time.monotonic() < deadline:
+        try:
+            ssh_run(host, "true", key_path)
+            return
+        except Exception as e:
+            last = e
+        time.sleep(poll)
+    raise TimeoutError(f"SSH non raggiungibile su {host}: {last}")
+
+# ------------------------
+# Warm pool: standby pre-avviati per scale-out quasi istantaneo
+# ------------------------
+def _standby_prefix(group: str) -> str:
+    return f"{group}_standby"
+
+class WarmPool:
+    """Standby `<group>_standby_N` già ACTIVE, con FIP e SSH verificato.
+
+    Un thread in background mantiene `size` standby pronti; `promote()` ne
+    rinomina uno in `<group>_clone_N`, per cui lo scale-out costa una sola
+    chiamata Nova invece del cold path create/wait/FIP.
+    """
+
+    def __init__(self, conn, ctx, group, size, key_path, verify_timeout=180, image_fn=None):
+        self.conn = conn
+        self.ctx = ctx
+        self.image_fn = image_fn        # () -> immagine di boot (None = ctx.image)
+        self.group = group
+        self.size = size
+        self.key_path = key_path
+        self.verify_timeout = verify_timeout
+        self.ready = deque()            # deployer.Replica pronte per la promozione
+        self.booting = 0
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.stopping = threading.Event()
+        self.thread = None
+
+    def adopt(self, inv):
+        """Riprende gli standby già esistenti (es. dopo un riavvio del controller)."""
+        pref = _standby_prefix(self.group) + "_"
+        for s in inv.list():
+            if not (s.name or "").startswith(pref) or getattr(s, "status", "").upper() != "ACTIVE":
+                continue
+            fip = inv.fip(s)
+            if not fip:
+                continue
+            try:
+                wait_ssh_ready(fip, self.key_path, timeout=10)
+            except Exception:
+                continue
+            self.ready.append(deployer.Replica(server=s, fip=fip))
+            print(f"[pool] Standby esistente adottato: {s.name} @ {fip}")
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name="warm-pool", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopping.set(); self.wake.set()
+
+    def _run(self):
+        while not self.stopping.is_set():
+            with self.lock:
+                missing = self.size - len(self.ready) - self.booting
+                if missing > 0:
+                    self.booting += 1
+            if missing <= 0:
+                self.wake.wait(5); self.wake.clear()
+                continue
+            try:
+                t0 = time.monotonic()
+                r = deployer.create_replica(self.conn, self.ctx, _standby_prefix(self.group), snapshot=False,
+                                            image=self.image_fn() if self.image_fn else None)
+                wait_ssh_ready(r.address, self.key_path, timeout=self.verify_timeout)
+                with self.lock:
+                    self.ready.append(r)
+                print(f"[pool] Standby pronto: {r.server.name} @ {r.address} ({time.monotonic() - t0:.1f}s)")
+            except Exception as e:
+                print(f"[!] Refill warm pool fallito: {e}")
+                self.stopping.wait(10)
+            finally:
+                with self.lock:
+                    self.booting -= 1
+
+    def promote(self, new_name):
+        """Rinomina uno standby in `new_name`; None se il pool è vuoto."""
+        while True:
+            with self.lock:
+                if not self.ready:
+                    return None
+                r = self.ready.popleft()
+            self.wake.set()
+            try:
+                r.server = self.conn.compute.update_server(r.server, name=new_name)
+                self.conn.compute.set_server_metadata(r.server, autoscale_role="replica")
+                return r
+            except Exception as e:
+                print(f"[!] Standby '{r.server.name}' non promuovibile ({e}), provo il successivo")
+
+# ------------------------
+# Azioni di scaling in background
+# ------------------------
+class ScaleAction:
+    """Scale-up (`up`) o scale-down (`down`) eseguito fuori dal ciclo di controllo.
+
+    Stati: pending -> booting|deleting -> ready, oppure failed / cancelled.
+    """
+    DONE = ("ready", "failed", "cancelled")
+
+    def __init__(self, kind, target, clock=time):
+        self.kind = kind
+        self.target = target        # nome della replica creata/rimossa
+        self.state = "pending"
+        self.server = None          # noto appena Nova accetta la create_server
+        self.result = None
+        self.error = None
+        self.clock = clock
+        self.started = clock.monotonic()
+        self.finished = None
+        self.reported = False
+        self.future = None
+        self.torn_down = False      # VM creata già eliminata da on_abort
+        self.aborts = []            # future delle teardown di on_abort
+
+    @property
+    def done(self):
+        return self.state in self.DONE
+
+    def settled(self):
+        """True quando il lavoro (e l'eventuale teardown) è davvero finito, anche dopo un timeout."""
+        return (self.future is None or self.future.done()) and all(f.done() for f in self.aborts)
+
+    def work_failed(self):
+        """Il lavoro non è andato a buon fine (mai partito o finito con errore); solo se settled()."""
+        return self.future is not None and (self.future.cancelled() or self.future.exception() is not None)
+
+    def elapsed(self):
+        return (self.finished or self.clock.monotonic()) - self.started
+
+    def __repr__(self):
+        return f"<{self.kind} {self.target} {self.state} {self.elapsed():.0f}s>"
+
+class ActionTracker:
+    """Esegue le azioni su un pool di thread, con timeout e cancellazione.
+
+    `on_abort(action)` viene chiamato (in background) quando un'azione già
+    partita è annullata o scade: serve a eliminare la VM eventualmente creata.
+    """
+
+    def __init__(self, on_abort=None, workers=4, timeout=900.0, clock=time, executor=None):
+        self.executor = executor or ThreadPoolExecutor(max_workers=workers, thread_name_prefix="scale")
+        self.on_abort = on_abort
+        self.timeout = timeout
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.actions = []
+
+    def submit(self, kind, target, fn):
+        action = ScaleAction(kind, target, clock=self.clock)
+        with self.lock:
+            self.actions.append(action)
+        action.future = self.executor.submit(self._run, action, fn)
+        return action
+
+    def _finish(self, action, state, error=None):
+        action.state = state; action.error = error
+        action.finished = self.clock.monotonic()
+
+    def _run(self, action, fn):
+        with self.lock:
+            if action.state != "pending":
+                return
+            action.state = "booting" if action.kind == "up" else "deleting"
+        try:
+            res = fn(action)
+            err = None
+        except Exception as e:
+            res, err = None, e
+        with self.lock:
+            late = action.done      # annullata o scaduta mentre lavorava
+            if not late:
+                action.result = res
+                self._finish(action, "failed" if err else "ready", err)
+        if late and action.kind == "up":
+            self._abort(action)
+        if err:
+            raise err       # resta nel future: work_failed() anche per le azioni scadute
+
+    def _abort(self, action):
+        if self.on_abort:
+            action.aborts.append(self.executor.submit(self.on_abort, action))
+
+    def cancel(self, action, reason="annullata", state="cancelled"):
+        with self.lock:
+            if action.done:
+                return False
+            started = action.state != "pending"
+            self._finish(action, state, RuntimeError(reason))
+        if not started:
+            action.future.cancel()
+        elif action.kind == "up":
+            self._abort(action)
+        return True
+
+    def in_flight(self, kind=None):
+        with self.lock:
+            return [a for a in self.actions if not a.done and (kind is None or a.kind == kind)]
+
+    def poll(self):
+        """Applica i timeout e ritorna le azioni concluse dall'ultima chiamata."""
+        for a in self.in_flight():
+            if a.elapsed() > self.timeout:
+                self.cancel(a, reason=f"timeout dopo {self.timeout:.0f}s", state="failed")
+        with self.lock:
+            finished = [a for a in self.actions if a.done and not a.reported]
+            for a in finished:
+                a.reported = True
+            self.actions = [a for a in self.actions if not a.reported]
+        return finished
+
+    def shutdown(self):
+        for a in self.in_flight():
+            if a.state == "pending":
+                self.cancel(a, reason="shutdown")
+        self.executor.shutdown(wait=False)
+
+class EventLog:
+    """Eventi del controller in JSON lines (un oggetto per riga), da correlare col carico (load_driver.py)."""
+
+    def __init__(self, path, group):
+        self.f = open(path, "a", buffering=1)
+        self.group = group
+        self.lock = threading.Lock()
+
+    def __call__(self, kind, target):
+        line = json.dumps({"time": time.time(), "group": self.group, "event": kind, "target": target})
+        with self.lock:
+            self.f.write(line + "\n")
+
+    def close(self):
+        self.f.close()
+
+# ------------------------
+# Replica set: base + cloni, con limiti min/max
+# ------------------------
+def _created_key(server):
+    return getattr(server, "created_at", None) or ""
+
+class ReplicaSet:
+    """Controller del gruppo `group` (VM base + `<group>_clone_N`).
+
+    Il nome del gruppo resta quello della base anche dopo che la base è stata
+    rimossa: i nuovi cloni continuano a chiamarsi `<group>_clone_N`.
+    Gli scale-up/down girano in background (ActionTracker): il campionamento
+    continua a ogni --interval anche mentre un clone sta facendo boot.
+    """
+
+    def __init__(self, conn, args, inventory, ctx=None, sampler=None, clock=time, executor=None, metrics=None):
+        self.conn = conn
+        self.args = args
+        self.inv = inventory
+        self.ctx = ctx          # deployer.DeployContext, preparato una volta sola
+        self.clock = clock
+        self.executor = executor
+        self.group = args.server
+        self.pool = None        # WarmPool opzionale
+        self.on_event = None    # callback(kind, target): decisioni up/down e azioni concluse ("up-ready", ...)
+        self.metrics = metrics or ControllerMetrics()
+        if sampler is None and args.stream:
+            sampler = StreamSampler(args.ssh_key_path, args.stream_interval, args.stream_stat,
+                                    metrics=self.metrics, clock=clock)
+        self.sampler = sampler or SshSampler(args.ssh_key_path)
+        self.actions = ActionTracker(on_abort=self._abort_action, timeout=args.action_timeout,
+                                     clock=clock, executor=executor)
+        self.unsettled = []     # azioni annullate/scadute il cui lavoro (o teardown) è ancora in corso
+        self.cold_times = deque(maxlen=20)      # durate cold path (create_replica)
+        self.last = {}          # nome -> valore metrica dell'ultimo campione
+        self.history = MetricHistory(size=args.history)
+        self.policy = build_policy(args.policy, high=args.high, low=args.low, min_up=args.min_up,
+                                   min_down=args.min_down, window=args.window, alpha=args.ewma_alpha)
+        if args.predictive != "off":
+            self.policy = PredictivePolicy(self.policy, method=args.predictive, lead_time=self.lead_time,
+                                           dry_run=args.predict_dry_run)
+
+    def replicas(self):
+        """Tutte le repliche vive del gruppo (base inclusa, se esiste)."""
+        out = []
+        with self.metrics.discovery.time(clock=self.clock):
+            self.inv.refresh()
+            base = self.inv.find(self.group)
+            if base and getattr(base, "status", "").upper() not in ("DELETED", "SOFT_DELETED"):
+                out.append(base)
+            out += [c for c, _ in _list_clones(self.inv, self.group)]
+        return out
+
+    def hosts(self, replicas):
+        hosts = []
+        for r in replicas:
+            if getattr(r, "status", "").upper() != "ACTIVE":
+                continue
+            fip = self.inv.fip(r)
+            if fip:
+                hosts.append((r.name, fip))
+        return hosts
+
+    def sample(self, hosts):
+        samples = self.sampler.sample(hosts)
+        now = self.clock.monotonic()
+        values = []
+        self.last = {}
+        m = self.metrics
+        for name, r in samples.items():
+            if isinstance(r, Exception):
+                m.ssh_failures.inc()
+                print(f"[!] Campionamento fallito su '{name}': {r}"); continue
+            cpu, mem, took = r[:3]
+            v = _metric_value(self.args.metric, cpu, mem)
+            values.append(v); self.last[name] = v
+            m.host_cpu.set(cpu, host=name); m.host_mem.set(mem, host=name)
+            if len(r) > 3:
+                # stream: ogni punto sub-secondo va nei ring buffer dell'host
+                for t, c, mm, modes in r[3]:
+                    self.history.record(name, t, cpu=c, mem=mm, value=_metric_value(self.args.metric, c, mm), **modes)
+                for mode, pct in r[3][-1][3].items():
+                    m.host_cpu_mode.set(pct, host=name, mode=mode)
+                print(f"[metrics] {name}: cpu={cpu:.1f}% mem={mem:.1f}% -> {self.args.metric}={v:.1f}% "
+                      f"(stream {len(r[3])} punti, {self.args.stream_stat}, età {took:.2f}s)")
+                continue
+            self.history.record(name, now, cpu=cpu, mem=mem, value=v)
+            m.ssh_sample.observe(took)
+            print(f"[metrics] {name}: cpu={cpu:.1f}% mem={mem:.1f}% -> {self.args.metric}={v:.1f}% (sample {took:.2f}s)")
+        if not values:
+            raise RuntimeError("nessun campione valido dalla flotta")
+        stats = fleet_stats(values)
+        print(f"[fleet] n={len(values)} mean={stats['mean']:.1f}% max={stats['max']:.1f}% "
+              f"p95={stats['p95']:.1f}% -> {self.args.fleet_stat}={stats[self.args.fleet_stat]:.1f}%")
+        self.history.record(MetricHistory.FLEET, now, value=stats[self.args.fleet_stat])
+        m.fleet_value.set(stats[self.args.fleet_stat])
+        return stats[self.args.fleet_stat]
+
+    def pick_victims(self, replicas, n):
+        """Sceglie le n repliche da rimuovere secondo --scale-in (senza campioni: le più recenti)."""
+        if self.args.scale_in == "newest" or not self.last:
+            ordered = sorted(replicas, key=_created_key, reverse=True)
+        else:
+            # least-loaded: le repliche non campionate (non ACTIVE / senza FIP) vanno via per prime
+            ordered = sorted(replicas, key=lambda r: (self.last.get(r.name, -1.0), _created_key(r)))
+        return ordered[:n]
+
+    def lead_time(self):
+        """Lead time di provisioning misurato (mediana dei cold path), altrimenti --lead-time."""
+        if self.pool and self.pool.ready:
+            return self.args.interval     # promozione quasi istantanea
+        if self.cold_times:
+            return percentile(self.cold_times, 50)
+        return self.args.lead_time
+
+    def ensure_context(self):
+        if self.ctx is None:
+            self.ctx = deployer.prepare_context(self.conn, self.args.deploy_keypair,
+                                                self.args.deploy_pubkey_file, clock=self.clock)
+        if self.ctx.snapshots is None and self.args.snapshot_retain > 0:
+            # snapshot dei cloni fuori dal percorso critico: lo scale-up finisce a VM ACTIVE + FIP
+            self.ctx.snapshots = deployer.SnapshotQueue(self.conn, clock=self.clock, executor=self.executor,
+                                                        waiter=self.ctx.waiter)
+        return self.ctx
+
+    def clone_image(self):
+        """Immagine dei nuovi cloni: stock (ctx.image) o l'ultimo snapshot della base (--clone-image)."""
+        ctx = self.ensure_context()
+        if self.args.clone_image != "base-snapshot":
+            return ctx.image
+        return deployer.clone_image(self.conn, ctx, self.group, deployer._split_stores(self.args.image_store))
+
+    def _event(self, kind, target):
+        if self.on_event:
+            self.on_event(kind, target)
+
+    # --- azioni ---
+
+    def _create(self, action):
+        def on_created(server):
+            action.server = server
+            if action.done:
+                raise RuntimeError("azione annullata durante il boot")
+        return deployer.create_replica(self.conn, self.ensure_context(), _pick_primary_clone_name(self.group),
+                                       snapshot=self.args.snapshot_retain > 0, retain=self.args.snapshot_retain,
+                                       name=action.target, on_created=on_created, image=self.clone_image())
+
+    def _destroy(self, action):
+        # gli snapshot della base (snap-of:<base>) sono l'immagine dei cloni con --clone-image base-snapshot
+        deployer.destroy_replica(self.conn, action.target, wipe_snaps=action.target != self.group, clock=self.clock)
+
+    def _abort_action(self, action):
+        # on_abort arriva sia da cancel() sia dalla fine tardiva di _run: una sola teardown per azione
+        with self.actions.lock:
+            if action.server is None or action.torn_down:
+                return
+            action.torn_down = True
+        print(f"[-] Elimino '{action.target}' creato da un'azione {action.state}")
+        deployer.destroy_replica(self.conn, action.target, wipe_snaps=True, clock=self.clock)
+
+    def scale_up(self, n):
+        for _ in range(n):
+            reserved = [a.target for a in self.actions.in_flight("up")]
+            reserved += [a.target for a in self.unsettled if a.kind == "up"]
+            name = _next_clone_name(self.inv, self.group, reserved)
+            if self.pool:
+                t0 = self.clock.monotonic()
+                r = self.pool.promote(name)
+                if r:
+                    took = self.clock.monotonic() - t0
+                    self.metrics.promotions.observe(took)
+                    self.inv.upsert(r.server, fip=r.address)
+                    self._event("up", r.server.name)
+                    cold = (f"cold path medio {sum(self.cold_times) / len(self.cold_times):.1f}s"
+                            if self.cold_times else "cold path non ancora misurato")
+                    print(f"[+] SCALE UP: promosso standby -> '{r.server.name}' @ {r.address} in {took:.2f}s ({cold})")
+                    continue
+                print("[-] Warm pool vuoto: uso il cold path")
+            print(f"[+] SCALE UP: avvio creazione di '{name}' in background")
+            self.actions.submit("up", name, self._create)
+            self._event("up", name)
+
+    def scale_down(self, victims):
+        for v in victims:
+            what = "base" if v.name == self.group else "clone"
+            print(f"[+] SCALE DOWN: elimino {what} '{v.name}' in background")
+            fip = self.inv.fip(v)
+            self.inv.forget(v.id)
+            self.history.forget(v.name)
+            self.metrics.forget_host(v.name)
+            self.actions.submit("down", v.name, self._destroy).server = v
+            self._event("down", v.name)
+            if fip:
+                self.sampler.close(fip)
+
+    def _reap(self):
+        for a in self.actions.poll():
+            self.metrics.actions.observe(a.elapsed(), kind=a.kind, state=a.state)
+            self._event(f"{a.kind}-{a.state}", a.target)
+            if a.kind == "up" and a.state == "ready":
+                self.cold_times.append(a.elapsed())
+                self.inv.upsert(a.result.server, fip=a.result.address)
+                print(f"[i] Clone '{a.target}' pronto @ {a.result.address} (cold path {a.elapsed():.1f}s)")
+            elif a.state == "ready":
+                print(f"[i] Replica '{a.target}' eliminata ({a.elapsed():.1f}s)")
+            else:
+                print(f"[!] Azione {a.kind} su '{a.target}' {a.state}: {a.error}")
+                self.unsettled.append(a)
+        # dopo un timeout il thread può essere ancora al lavoro: si decide solo a lavoro finito
+        for a in [x for x in self.unsettled if x.settled()]:
+            self.unsettled.remove(a)
+            if a.kind == "down" and a.server is not None and a.work_failed():
+                # la VM esiste ancora: torna nel conteggio delle repliche e può essere riscelta
+                print(f"[i] Replica '{a.target}' non eliminata: torna tra le repliche")
+                self.inv.restore(a.server)
+
+    def tick(self):
+        a = self.args
+        self._reap()
+        booting = self.actions.in_flight("up")
+        # boot annullati/scaduti ancora da smontare: né repliche né vittime
+        skip = {x.target for x in booting} | {x.target for x in self.unsettled if x.kind == "up"}
+        replicas = [r for r in self.replicas() if r.name not in skip]
+        n = len(replicas) + len(booting)      # capacità effettiva, boot in corso inclusi
+        self.metrics.replicas.set(len(replicas), state="serving")
+        self.metrics.replicas.set(len(booting), state="booting")
+        if self.pool:
+            self.metrics.replicas.set(len(self.pool.ready), state="standby")
+        if booting:
+            print(f"[i] Azioni in corso: {self.actions.in_flight()}")
+
+        # Riconciliazione dei limiti prima di guardare le metriche
+        if n < a.min_replicas:
+            print(f"[i] Repliche {n} < min {a.min_replicas}: riporto al minimo")
+            self.scale_up(a.min_replicas - n)
+            return
+        if n > a.max_replicas:
+            print(f"[i] Repliche {n} > max {a.max_replicas}: riporto al massimo")
+            try:
+                self.sample(self.hosts(replicas))
+            except RuntimeError as e:
+                # nessun host raggiungibile: il limite vale comunque, vittime per età come --scale-in newest
+                print(f"[!] {e}: scelgo le repliche da rimuovere per età")
+            self.shrink(replicas, booting, n - a.max_replicas)
+            return
+
+        self.sample(self.hosts(replicas))
+        self.history.prune(r.name for r in replicas)
+        now = self.clock.monotonic()
+        decision = self.policy.decide(self.history.ring(MetricHistory.FLEET, "value"), now)
+        st = self.policy.stats
+        if st:
+            print(f"[trend] policy={a.policy} n={st['n']} ewma={st['ewma']:.1f}% p50={st['p50']:.1f}% "
+                  f"p95={st['p95']:.1f}% slope={st['slope']:+.2f}%/s -> {decision or 'hold'}")
+        if decision:
+            self.metrics.decisions.inc(direction=decision)
+
+        # SCALE UP
+        if decision == "up":
+            add = min(a.step_up, a.max_replicas - n)
+            if add > 0:
+                self.scale_up(add)
+            else:
+                print(f"[-] SCALE UP saltato: già al massimo di {a.max_replicas} repliche.")
+            self.policy.reset(now)
+
+        # SCALE DOWN
+        if decision == "down":
+            remove = min(a.step_down, n - a.min_replicas)
+            if remove > 0:
+                self.shrink(replicas, booting, remove)
+            else:
+                print(f"[-] SCALE DOWN saltato: già al minimo di {a.min_replicas} repliche.")
+            self.policy.reset(now)
+
+    def run_once(self):
+        """Un ciclo di controllo strumentato: ritorna la durata del tick (s)."""
+        m = self.metrics
+        t0 = self.clock.monotonic()
+        try:
+            self.tick()
+        except Exception as e:
+            m.tick_errors.inc()
+            print(f"[!] Errore ciclo: {e}")
+        took = self.clock.monotonic() - t0
+        m.tick.observe(took)
+        m.tick_lag.set(max(0.0, took - self.args.interval))
+        if took > self.args.interval:
+            m.tick_overruns.inc()
+            print(f"[!] Ciclo di {took:.1f}s più lungo di --interval {self.args.interval}s: il campionamento è in ritardo")
+        m.last_tick.set(self.clock.time())
+        return took
+
+    def shrink(self, replicas, booting, n):
+        """Rimuove n repliche: prima annulla i boot in corso (dal più recente), poi le vive."""
+        for act in sorted(booting, key=lambda x: x.started, reverse=True)[:n]:
+            if self.actions.cancel(act, reason="scale-down"):
+                print(f"[+] SCALE DOWN: annullo il boot di '{act.target}'")
+                self._event("down", act.target)
+                n -= 1
+        if n > 0:
+            self.scale_down(self.pick_victims(replicas, n))
+
+    def close(self):
+        if self.pool:
+            self.pool.stop()
+        if self.ctx is not None and self.ctx.fip_pool is not None:
+            self.ctx.fip_pool.stop()
+        if self.ctx is not None and self.ctx.snapshots is not None:
+            if self.ctx.snapshots.pending():
+                print(f"[i] Snapshot ancora in corso all'uscita: {len(self.ctx.snapshots.pending())}")
+            self.ctx.snapshots.close(wait=False)
+        pending = self.actions.in_flight()
+        if pending:
+            print(f"[i] Azioni ancora in corso all'uscita: {pending}")
+        self.actions.shutdown()
+        for fip in [self.inv.fip(r) for r in self.inv.list()
+                    if r.name == self.group or _is_clone_of(self.group, r.name or "")]:
+            if fip:
+                self.sampler.close(fip)
 
 # ------------------------
 # Main
 # ------------------------
-def main():
+def build_parser():
     ap = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
-    ap.add_argument("--server", required=False, help="Nome della VM da monitorare (se assente, verrà richiesto interattivamente)")
+    ap.add_argument("--server", required=False, help="Nome della VM base del gruppo (se assente, verrà richiesto interattivamente)")
     ap.add_argument("--clone", required=True, help="(Compatibilità) Prefisso/nome clone legacy: mantenuto ma NON usato per il naming")
-    ap.add_argument("--high", type=float, default=80.0, help="Soglia alta per lo scale-up (%)")  # default 80
-    ap.add_argument("--low",  type=float, default=20.0, help="Soglia bassa per lo scale-down (%)")
-    ap.add_argument("--min-up", type=int, default=4, help="Campioni consecutivi sopra HIGH per scalare su")
-    ap.add_argument("--min-down", type=int, default=4, help="Campioni consecutivi sotto LOW per scalare giù")
+    ap.add_argument("--high", type=float, default=80.0, help="Soglia alta per lo scale-up (%%)")  # default 80
+    ap.add_argument("--low",  type=float, default=20.0, help="Soglia bassa per lo scale-down (%%)")
+    ap.add_argument("--min-up", type=int, default=4, help="Campioni (consecutivi con --policy hits) sopra HIGH per scalare su")
+    ap.add_argument("--min-down", type=int, default=4, help="Campioni (consecutivi con --policy hits) sotto LOW per scalare giù")
     ap.add_argument("--interval", type=int, default=5, help="Intervallo di campionamento (s)")
     ap.add_argument("--metric", choices=["cpu","mem","max"], default="max", help="Metrica da usare")
+    ap.add_argument("--fleet-stat", choices=["mean","max","p95"], default="mean",
+                    help="Aggregato sulla flotta (base + cloni) usato per le decisioni")
+    ap.add_argument("--policy", choices=sorted(POLICIES), default="hits",
+                    help="Policy di decisione: hits (campioni consecutivi), ewma, percentile (p50 su/p95 giù)")
+    ap.add_argument("--window", type=int, default=12, help="Campioni della finestra usata dalla policy")
+    ap.add_argument("--ewma-alpha", type=float, default=0.3, help="Peso del campione più recente nella EWMA")
+    ap.add_argument("--stream", action="store_true",
+                    help="Metriche in streaming da un campionatore BusyBox nel guest (sessione SSH persistente)")
+    ap.add_argument("--stream-interval", type=float, default=0.25,
+                    help="(--stream) Intervallo di campionamento nel guest (s, anche sotto il secondo)")
+    ap.add_argument("--stream-stat", choices=["mean", "max", "p95"], default="mean",
+                    help="(--stream) Come riassumere la CPU dei punti di un host arrivati in un --interval")
+    ap.add_argument("--history", type=int, default=360, help="Campioni conservati per host/metrica (ring buffer)")
+    ap.add_argument("--predictive", choices=["off"] + sorted(FORECASTERS), default="off",
+                    help="Scale-out predittivo: anticipa se il trend supera HIGH entro il lead time di provisioning")
+    ap.add_argument("--lead-time", type=float, default=120.0,
+                    help="Lead time (s) usato finché non è stato misurato almeno un cold path")
+    ap.add_argument("--predict-dry-run", action="store_true",
+                    help="Logga crossing previsti vs reali senza scalare sulla previsione")
+    ap.add_argument("--min-replicas", type=int, default=1, help="Numero minimo di repliche (base inclusa)")
+    ap.add_argument("--max-replicas", type=int, default=4, help="Numero massimo di repliche (base inclusa)")
+    ap.add_argument("--step-up", type=int, default=1, help="Repliche aggiunte per ogni scale-up")
+    ap.add_argument("--step-down", type=int, default=1, help="Repliche rimosse per ogni scale-down")
+    ap.add_argument("--scale-in", choices=["least-loaded","newest"], default="least-loaded",
+                    help="Quale replica rimuovere nello scale-down")
+    ap.add_argument("--action-timeout", type=float, default=900.0,
+                    help="Timeout (s) di uno scale-up/scale-down in background; allo scadere viene annullato")
+    ap.add_argument("--warm-pool", type=int, default=0,
+                    help="Standby pre-avviati (ACTIVE+FIP+SSH) da promuovere allo scale-up (0 = disattivo)")
+    ap.add_argument("--fip-pool", type=int, default=0,
+                    help="Floating IP liberi pre-allocati per i nuovi cloni/standby (0 = allocazione on demand)")
+    ap.add_argument("--snapshot-retain", type=int, default=3,
+                    help="Snapshot post-boot per clone, presi in background (0 = nessuno snapshot dei cloni)")
+    ap.add_argument("--clone-image", choices=["stock", "base-snapshot"], default="stock",
+                    help="Immagine dei cloni: quella del deployer (cirros) o l'ultimo snapshot della VM base")
+    ap.add_argument("--image-store", default=os.environ.get("DEPLOYVM_IMAGE_STORE", ""),
+                    help="(--clone-image base-snapshot) Store Glance preferiti, separati da virgola (es. local)")
+    ap.add_argument("--warm-pool-verify-timeout", type=float, default=180.0,
+                    help="Attesa massima (s) della verifica SSH di un nuovo standby")
+    ap.add_argument("--inventory-ttl", type=float, default=5.0,
+                    help="Età massima (s) dell'inventario server prima di un refresh incrementale")
+    ap.add_argument("--inventory-full-every", type=float, default=300.0,
+                    help="Ogni quanti secondi rifare un listing completo dei server")
+    ap.add_argument("--metrics-port", type=int, default=int(os.environ.get("AUTOSCALE_METRICS_PORT", "0")),
+                    help="Porta dell'endpoint HTTP /metrics (Prometheus/OpenMetrics); 0 = disattivo")
+    ap.add_argument("--metrics-addr", default="127.0.0.1",
+                    help="Indirizzo di ascolto di /metrics (0.0.0.0 per lo scrape da un altro host)")
+    ap.add_argument("--event-log", metavar="PATH",
+                    help="Appende decisioni di scaling e azioni concluse in JSON lines (per load_driver.py --events)")
     ap.add_argument("--ssh-key-path", default=os.environ.get("AUTOSCALE_SSH_KEY","~/.ssh/lab-key-rsa"),
                     help="Chiave privata per SSH sulla VM monitorata")
     ap.add_argument("--deploy-keypair", default=os.environ.get("DEPLOYVM_KEYPAIR","lab-key"),
                     help="Keypair da usare per creare i cloni")
     ap.add_argument("--deploy-pubkey-file", default=os.environ.get("DEPLOYVM_PUBKEY"),
                     help="Eventuale file di public key da (ri)inserire in OpenStack")
-    args = ap.parse_args()
+    return ap
 
+def check_args(args):
+    """Applica i vincoli sui parametri di un gruppo; ritorna un messaggio d'errore o None."""
     # Forza minimo effettivo 80% anche se da CLI passi meno (es. --high 60)
     MIN_HIGH = 80.0
     if args.high < MIN_HIGH:
         print(f"[i] --high richiesto {args.high:.1f}% < soglia minima {MIN_HIGH:.1f}%, uso {MIN_HIGH:.1f}%.")
         args.high = MIN_HIGH
+    if not 1 <= args.min_replicas <= args.max_replicas:
+        return "Serve 1 <= --min-replicas <= --max-replicas"
+    if args.stream and not 0 < args.stream_interval < args.interval:
+        return "Serve 0 < --stream-interval < --interval"
+    return None
+
+def start_warm_pool(rs, inv):
+    a = rs.args
+    rs.pool = WarmPool(rs.conn, rs.ensure_context(), rs.group, a.warm_pool, a.ssh_key_path,
+                       verify_timeout=a.warm_pool_verify_timeout, image_fn=rs.clone_image)
+    rs.pool.adopt(inv)
+    rs.pool.start()
+    print(f"[pool] Warm pool attivo: {a.warm_pool} standby '{_standby_prefix(rs.group)}_N'")
+
+def main():
+    args = build_parser().parse_args()
+    err = check_args(args)
+    if err:
+        print(f"[!] {err}", file=sys.stderr); sys.exit(2)
 
-    conn = connection.Connection(cloud='microstack')
+    metrics = ControllerMetrics()
+    conn = InstrumentedConnection(deployer.connect(), metrics)
+    inv = ServerInventory(conn, ttl=args.inventory_ttl, full_every=args.inventory_full_every)
 
     if not args.server:
         if sys.stdin.isatty() and sys.stdout.isatty():
-            args.server = _choose_server_interactive(conn)
+            args.server = _choose_server_interactive(inv)
         else:
             print("[!] Parametro --server obbligatorio in esecuzione non-interattiva.", file=sys.stderr); sys.exit(2)
 
-    base = conn.compute.find_server(args.server)
-    if not base:
-        print(f"[!] VM '{args.server}' non trovata", file=sys.stderr); sys.exit(1)
-    fip = _get_server_fip(conn, base)
-    if not fip:
-        print("[!] Nessun Floating IP associato alla VM monitorata", file=sys.stderr); sys.exit(1)
+    rs = ReplicaSet(conn, args, inv, metrics=metrics)
+    if args.event_log:
+        rs.on_event = EventLog(args.event_log, rs.group)
+    replicas = rs.replicas()
+    if not replicas:
+        print(f"[!] VM '{args.server}' non trovata (né suoi cloni)", file=sys.stderr); sys.exit(1)
+    if not rs.hosts(replicas):
+        print("[!] Nessun Floating IP associato alle VM del gruppo", file=sys.stderr); sys.exit(1)
+    # Rete/SG/keypair/immagine/flavor risolti una volta: gli scale-out partono subito da create_server
+    ctx = rs.ensure_context()
+    if args.fip_pool > 0:
+        ctx.fip_pool = deployer.FipPool(conn, size=args.fip_pool)
+        ctx.fip_pool.on_attach = metrics.fip_attach.observe
+        ctx.fip_pool.start()
+        print(f"[pool] FIP pool attivo: {args.fip_pool} Floating IP pre-allocati")
+    if args.warm_pool > 0:
+        start_warm_pool(rs, inv)
 
-    print("[*] Autoscaler avviato")
-    print(f"[i] Monitor su '{args.server}' @ {fip} — metric={args.metric}, HIGH={args.high:.1f}%, LOW={args.low:.1f}%")
+    if args.metrics_port:
+        serve_metrics(metrics.registry, args.metrics_port, args.metrics_addr)
+        print(f"[i] Metriche esposte su http://{args.metrics_addr}:{args.metrics_port}/metrics")
 
-    hi_hits = lo_hits = 0
+    print("[*] Autoscaler avviato")
+    print(f"[i] Gruppo '{rs.group}': repliche={[r.name for r in replicas]} — metric={args.metric}, "
+          f"HIGH={args.high:.1f}%, LOW={args.low:.1f}%, repliche {args.min_replicas}..{args.max_replicas}")
 
     try:
         while True:
-            try:
-                cpu, mem = get_metrics(fip, args.ssh_key_path)
-                val = cpu if args.metric == "cpu" else mem if args.metric == "mem" else max(cpu, mem)
-                print(f"[metrics] cpu={cpu:.1f}% mem={mem:.1f}% -> {args.metric}={val:.1f}%")
-
-                if val >= args.high:
-                    hi_hits += 1; lo_hits = 0
-                elif val <= args.low:
-                    lo_hits += 1; hi_hits = 0
-                else:
-                    hi_hits = lo_hits = 0
-
-                clones = _list_clones(conn, args.server)
-
-                # SCALE UP
-                if hi_hits >= args.min_up:
-                    if clones:
-                        short = [(s.name, getattr(s, "status", "?")) for (s, idx) in clones]
-                        print(f"[-] SCALE UP saltato: clone già presente {short}.")
-                    else:
-                        print(f"[+] SCALE UP: creo clone per '{args.server}'")
-                        cmd = ["~/deploy_secure_vm.py","--name", _pick_primary_clone_name(args.server),
-                               "--retain","3","--keypair", args.deploy_keypair]
-                        if args.deploy_pubkey_file:
-                            cmd += ["--pubkey-file", args.deploy_pubkey_file]
-                        subprocess.run(" ".join(cmd), shell=True, check=True)
-                    hi_hits = 0
-
-                # SCALE DOWN
-                if lo_hits >= args.min_down:
-                    if clones:
-                        chosen_clone, chosen_idx = clones[-1]
-                        print(f"[+] SCALE DOWN: elimino base '{args.server}' e continuo su clone '{chosen_clone.name}'")
-                        cmd = ["~/deploy_secure_vm.py","--cleanup", args.server,"--wipe-snaps","--yes"]
-                        subprocess.run(" ".join(cmd), shell=True, check=True)
-                        args.server = chosen_clone.name
-                        base = conn.compute.find_server(args.server)
-                        fip = _get_server_fip(conn, base)
-                        if not fip:
-                            print(f"[!] Il clone '{args.server}' non ha FIP. Uscita.", file=sys.stderr); sys.exit(1)
-                        print(f"[i] Ora monitoro il clone '{args.server}' @ {fip}")
-                    else:
-                        print("[-] SCALE DOWN: niente clone, niente delete (salto).")
-                    lo_hits = 0
-
-            except Exception as e:
-                print(f"[!] Errore ciclo: {e}")
-            time.sleep(args.interval)
+            took = rs.run_once()
+            time.sleep(max(0.0, args.interval - took))
     except KeyboardInterrupt:
         print("[+] Autoscaler interrotto dall’utente, uscita pulita.")
+    finally:
+        rs.close()
 
 if __name__ == "__main__":
     main()
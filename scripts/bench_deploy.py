@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""Benchmark del provisioning di deploy_secure_vm.py, fase per fase.
+
+Crea e distrugge K istanze in sequenza con il tracer del deployer e riporta
+p50/p95 di durata e chiamate API per ogni fase (ensure_network_bits, ...,
+wait_server_active, ensure_fip, snapshot_and_wait, cleanup). Con
+--background-snapshots lo snapshot passa dalla SnapshotQueue: sul percorso
+critico resta solo start_snapshot, l'attesa compare come snapshot_background.
+
+Con --from-snapshot VM le istanze partono dall'ultimo snapshot di VM invece che
+da cirros; --compare-images esegue K cicli per ciascuna delle due immagini e
+confronta il time-to-SSH-ready (da create_server alla prima sessione SSH, fase
+wait_ssh: serve --ssh-key su MicroStack, col cloud finto è simulato).
+
+Con --fake gira sul cloud finto di openstack_sim.py in tempo simulato: le
+durate riflettono le latenze configurate, le chiamate API sono quelle reali
+del codice del deployer.
+
+Esempi:
+  python3 scripts/bench_deploy.py --count 5 --json bench.json          # MicroStack
+  python3 scripts/bench_deploy.py --fake --count 20 --boot-latency 45  # offline
+  python3 scripts/bench_deploy.py --compare-images --from-snapshot VM-test_1 --ssh-key ~/.ssh/lab-key-rsa
+"""
+import argparse, contextlib, json, os, sys, time
+
+# stesso lookup del deployer di autoscale_watch.py: root del repo, poi $HOME
+for _d in (os.environ.get("AUTOSCALE_DEPLOYER_DIR"),
+           os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+           os.path.expanduser("~")):
+    if _d and _d not in sys.path:
+        sys.path.append(_d)
+import deploy_secure_vm as deployer
+from autoscale_policy import percentile
+
+class _Deferred:
+    """Job della SnapshotQueue eseguito solo a result(): tiene separate le fasi anche col clock simulato."""
+
+    def __init__(self, fn, a, kw):
+        self.fn, self.a, self.kw = fn, a, kw
+        self._done = False
+
+    def done(self):
+        return self._done
+
+    def result(self):
+        if not self._done:
+            self.value = self.fn(*self.a, **self.kw)
+            self._done = True
+        return self.value
+
+class _DeferredExecutor:
+    def submit(self, fn, *a, **kw):
+        return _Deferred(fn, a, kw)
+
+    def shutdown(self, wait=True):
+        pass
+
+def ssh_waiter(args, raw, clock):
+    """-> wait(replica) che ritorna quando la VM risponde via SSH, o None se non misurabile."""
+    if args.fake:
+        def wait(rep):
+            deadline = clock.monotonic() + args.ssh_timeout
+            while not raw.guest_ready(rep.server):
+                if clock.monotonic() >= deadline:
+                    raise TimeoutError(f"SSH non pronto su {rep.server.name}")
+                clock.sleep(1.0)
+        return wait
+    if args.ssh_key:
+        from autoscale_watch import wait_ssh_ready
+        return lambda rep: wait_ssh_ready(rep.address, args.ssh_key, timeout=args.ssh_timeout, poll=1)
+    return None
+
+def run(conn, clock, args, from_snapshot=None, wait_ssh=None):
+    """Esegue K cicli provision+teardown; ritorna i report del tracer."""
+    reports = []
+    ctx = None
+    for i in range(args.count):
+        tracer = deployer.PhaseTracer(conn, clock=clock)
+        rep = ready = None
+        try:
+            if ctx is None or not args.reuse_context:
+                ctx = deployer.prepare_context(conn, args.keypair, args.pubkey_file, clock=clock, tracer=tracer)
+                if args.background_snapshots:
+                    ctx.snapshots = deployer.SnapshotQueue(conn, clock=clock, executor=_DeferredExecutor(),
+                                                           waiter=ctx.waiter)
+            image = None
+            if from_snapshot:
+                with deployer._phase(tracer, "pick_snapshot"):
+                    image = deployer.clone_image(conn, ctx, from_snapshot, deployer._split_stores(args.image_store))
+            t0 = clock.monotonic()
+            rep = deployer.create_replica(conn, ctx, args.base, snapshot=args.snapshot, retain=1, tracer=tracer,
+                                          image=image)
+            if wait_ssh:
+                with deployer._phase(tracer, "wait_ssh"):
+                    wait_ssh(rep)
+                ready = clock.monotonic() - t0
+            if rep.snapshot_job is not None:
+                # fuori dal percorso critico: misurato a parte prima del teardown
+                with deployer._phase(tracer, "snapshot_background"):
+                    rep.snapshot_job.result()
+        except Exception as e:
+            print(f"[!] Run {i + 1}: provisioning fallito: {e}", file=sys.stderr)
+        finally:
+            if rep is not None and not args.keep:
+                deployer.destroy_replica(conn, rep.server.name, wipe_snaps=True, tracer=tracer, clock=clock)
+        r = tracer.report()
+        if wait_ssh and rep is not None and all(p["ok"] for p in r["phases"]):
+            r["ssh_ready_seconds"] = ready
+        reports.append(r)
+        print(f"[i] Run {i + 1}/{args.count}: {r['total_seconds']:.1f}s, {r['api_calls']} chiamate API"
+              + (f", SSH pronto in {r['ssh_ready_seconds']:.1f}s" if "ssh_ready_seconds" in r else ""),
+              file=sys.stderr)
+    return reports
+
+def aggregate(reports):
+    """{fase: {n, p50_s, p95_s, mean_s, p50_calls, p95_calls, errors}} nell'ordine di esecuzione."""
+    by = {}
+    for r in reports:
+        for p in r["phases"]:
+            by.setdefault(p["name"], []).append(p)
+    out = {}
+    for name, ps in by.items():
+        secs = [p["seconds"] for p in ps]
+        calls = [p.get("api_calls", 0) for p in ps]
+        out[name] = {"n": len(ps), "p50_s": percentile(secs, 50), "p95_s": percentile(secs, 95),
+                     "mean_s": sum(secs) / len(secs), "p50_calls": percentile(calls, 50),
+                     "p95_calls": percentile(calls, 95), "errors": sum(1 for p in ps if not p["ok"])}
+    totals = [r["total_seconds"] for r in reports]
+    calls = [r["api_calls"] for r in reports]
+    out["TOTAL"] = {"n": len(reports), "p50_s": percentile(totals, 50), "p95_s": percentile(totals, 95),
+                    "mean_s": sum(totals) / len(totals), "p50_calls": percentile(calls, 50),
+                    "p95_calls": percentile(calls, 95),
+                    "errors": sum(1 for r in reports if not all(p["ok"] for p in r["phases"]))}
+    ready = [r["ssh_ready_seconds"] for r in reports if "ssh_ready_seconds" in r]
+    if ready:
+        out["SSH_READY"] = {"n": len(ready), "p50_s": percentile(ready, 50), "p95_s": percentile(ready, 95),
+                            "mean_s": sum(ready) / len(ready), "p50_calls": 0, "p95_calls": 0,
+                            "errors": len(reports) - len(ready)}
+    return out
+
+def print_table(agg):
+    print(f"{'fase':<22} {'n':>3} {'p50 s':>9} {'p95 s':>9} {'media s':>9} {'API p50':>8} {'API p95':>8} {'err':>4}")
+    for name, a in agg.items():
+        print(f"{name:<22} {a['n']:>3} {a['p50_s']:>9.2f} {a['p95_s']:>9.2f} {a['mean_s']:>9.2f} "
+              f"{a['p50_calls']:>8.0f} {a['p95_calls']:>8.0f} {a['errors']:>4}")
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--count", type=int, default=5, help="Istanze da creare e distruggere (K)")
+    ap.add_argument("--base", default="bench-vm", help="Nome base delle VM di benchmark (<base>_N)")
+    ap.add_argument("--snapshot", action="store_true", help="Include snapshot_and_wait nel ciclo misurato")
+    ap.add_argument("--background-snapshots", action="store_true",
+                    help="(con --snapshot) Snapshot in background via SnapshotQueue, come l'autoscaler")
+    ap.add_argument("--from-snapshot", metavar="VM", help="Avvia le istanze dall'ultimo snapshot di VM")
+    ap.add_argument("--image-store", default="", help="(--from-snapshot) Store Glance preferiti, es. local")
+    ap.add_argument("--compare-images", action="store_true",
+                    help="K cicli da cirros e K da --from-snapshot, con confronto del time-to-SSH-ready")
+    ap.add_argument("--ssh-key", help="Chiave privata per misurare il time-to-SSH-ready (fase wait_ssh)")
+    ap.add_argument("--ssh-timeout", type=float, default=300.0, help="Attesa massima (s) della prima sessione SSH")
+    ap.add_argument("--reuse-context", action="store_true",
+                    help="Prepara il DeployContext una volta sola (percorso dell'autoscaler)")
+    ap.add_argument("--keep", action="store_true", help="Non distruggere le VM create")
+    ap.add_argument("--keypair", default=os.environ.get("DEPLOYVM_KEYPAIR", "lab-key"))
+    ap.add_argument("--pubkey-file", default=os.environ.get("DEPLOYVM_PUBKEY"))
+    ap.add_argument("--cloud", default="microstack", help="Nome del cloud in clouds.yaml")
+    ap.add_argument("--fake", action="store_true", help="Usa il cloud finto (openstack_sim) in tempo simulato")
+    ap.add_argument("--boot-latency", type=float, default=60.0, help="(--fake) Secondi BUILD -> ACTIVE")
+    ap.add_argument("--port-latency", type=float, default=5.0, help="(--fake) Secondi prima che il port esista")
+    ap.add_argument("--snapshot-latency", type=float, default=30.0, help="(--fake) Secondi per uno snapshot")
+    ap.add_argument("--guest-latency", type=float, default=20.0,
+                    help="(--fake) Secondi da ACTIVE a SSH pronto con l'immagine stock")
+    ap.add_argument("--snapshot-guest-latency", type=float, default=8.0,
+                    help="(--fake) Secondi da ACTIVE a SSH pronto partendo da uno snapshot")
+    ap.add_argument("--image-fetch-latency", type=float, default=15.0,
+                    help="(--fake) Secondi in più al primo boot di un'immagine non ancora in cache sul compute")
+    ap.add_argument("--json", help="Scrive report grezzi e aggregati in questo file")
+    ap.add_argument("--verbose", action="store_true", help="Mostra i log del deployer")
+    args = ap.parse_args()
+    if args.compare_images and not args.from_snapshot:
+        ap.error("--compare-images richiede --from-snapshot")
+
+    if args.fake:
+        from openstack_sim import FakeConnection, SteppingClock
+        clock = SteppingClock()
+        raw = FakeConnection(clock, boot_latency=args.boot_latency, port_latency=args.port_latency,
+                             snapshot_latency=args.snapshot_latency, guest_latency=args.guest_latency,
+                             snapshot_guest_latency=args.snapshot_guest_latency,
+                             image_fetch_latency=args.image_fetch_latency)
+        if args.from_snapshot:
+            # base finta con uno snapshot già pronto, come dopo deploy_secure_vm.py --name <base>
+            base = raw.add_server(args.from_snapshot)
+            deployer.start_snapshot(raw, base, deployer.snapshot_name(base.name))
+            clock.sleep(args.snapshot_latency)
+    else:
+        clock = time
+        raw = deployer.connect(args.cloud)
+    conn = deployer.CountingConnection(raw)
+    wait_ssh = ssh_waiter(args, raw, clock)
+
+    sources = ([None] if args.compare_images else []) + [args.from_snapshot]
+    results = {}
+    out = sys.stdout if args.verbose else open(os.devnull, "w")
+    for src in sources:
+        with contextlib.redirect_stdout(out):
+            reports = run(conn, clock, args, from_snapshot=src, wait_ssh=wait_ssh)
+        label = f"snapshot:{src}" if src else "stock"
+        results[label] = {"aggregate": aggregate(reports), "runs": reports}
+        if len(sources) > 1:
+            print(f"\n== {label}")
+        print_table(results[label]["aggregate"])
+    if args.compare_images:
+        ready = {k: v["aggregate"].get("SSH_READY") for k, v in results.items()}
+        if all(ready.values()):
+            (a, ra), (b, rb) = ready.items()
+            print(f"\nTime-to-SSH-ready p50: {a} {ra['p50_s']:.1f}s, {b} {rb['p50_s']:.1f}s "
+                  f"({rb['p50_s'] - ra['p50_s']:+.1f}s); p95: {ra['p95_s']:.1f}s vs {rb['p95_s']:.1f}s")
+        else:
+            print("\n[!] Time-to-SSH-ready non misurato (serve --ssh-key)", file=sys.stderr)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"fake": args.fake, "count": args.count, "results": results}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""Benchmark dell'avvio di deploy_secure_vm.py: import, connessione, autenticazione, discovery.
+
+Ogni run è un processo Python nuovo, come un'invocazione breve della CLI.
+Confronta l'avvio "cold" (cache vuota: autenticazione Keystone completa e
+discovery di rete/SG/keypair/immagine/flavor) con quello "warm" (token e ID
+dalla StartupCache). Riporta p50/p95 per fase e le chiamate API della discovery.
+
+Con --fake la discovery gira sul cloud finto (openstack_sim) e misura solo
+import e chiamate API: l'autenticazione richiede un vero Keystone.
+
+Esempi:
+  python3 scripts/bench_startup.py --count 10              # MicroStack (clouds.yaml)
+  python3 scripts/bench_startup.py --fake --count 10 --json startup.json
+"""
+import argparse, json, os, subprocess, sys, tempfile
+
+from autoscale_policy import percentile
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPTS = os.path.join(REPO, "scripts")
+
+# Eseguito in un processo nuovo per ogni run; stampa una riga JSON con i tempi.
+CHILD = r"""
+import contextlib, io, json, sys, time
+t0 = time.perf_counter()
+sys.path[:0] = [{repo!r}, {scripts!r}]
+import deploy_secure_vm as d
+out = {{"import_s": time.perf_counter() - t0, "sdk_loaded_at_import": "openstack" in sys.modules}}
+with contextlib.redirect_stdout(io.StringIO()):
+    t = time.perf_counter()
+    if {fake!r}:
+        from openstack_sim import FakeConnection, SteppingClock
+        clock = SteppingClock()
+        raw = FakeConnection(clock)
+        if {cache_dir!r}:
+            raw.deploy_cache = d.StartupCache.for_connection(raw, "fake", {cache_dir!r})
+    else:
+        clock = time
+        raw = d.connect({cloud!r}, cache_dir={cache_dir!r})
+    out["connect_s"] = time.perf_counter() - t
+    t = time.perf_counter()
+    if not {fake!r}:
+        raw.authorize()
+    out["auth_s"] = time.perf_counter() - t
+    conn = d.CountingConnection(raw)
+    t = time.perf_counter()
+    d.prepare_context(conn, {keypair!r}, clock=clock, cache=None if {cache_dir!r} else False)
+    out["discovery_s"] = time.perf_counter() - t
+    out["discovery_calls"] = conn.calls
+out["total_s"] = time.perf_counter() - t0
+print(json.dumps(out))
+"""
+
+STAGES = ["import_s", "connect_s", "auth_s", "discovery_s", "total_s", "discovery_calls"]
+
+def run_child(args, cache_dir):
+    code = CHILD.format(repo=REPO, scripts=SCRIPTS, fake=args.fake, cloud=args.cloud, keypair=args.keypair,
+                        cache_dir=cache_dir)
+    cp = subprocess.run([sys.executable, "-c", code], stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    if cp.returncode != 0:
+        raise RuntimeError(cp.stderr.strip().splitlines()[-1] if cp.stderr.strip() else "run fallito")
+    return json.loads(cp.stdout.strip().splitlines()[-1])
+
+def bench(args, mode):
+    runs = []
+    with tempfile.TemporaryDirectory(prefix="bench-startup-") as tmp:
+        if mode == "warm":
+            run_child(args, tmp)            # riempie la cache (token + ID)
+        for i in range(args.count):
+            # cold: nessuna cache; warm: la stessa directory, già popolata
+            runs.append(run_child(args, tmp if mode == "warm" else ""))
+            print(f"[i] {mode} {i + 1}/{args.count}: {runs[-1]['total_s']:.2f}s", file=sys.stderr)
+    return runs
+
+def summarize(runs):
+    return {k: {"p50": percentile([r[k] for r in runs], 50), "p95": percentile([r[k] for r in runs], 95)}
+            for k in STAGES}
+
+def print_table(agg):
+    modes = list(agg)
+    print(f"{'fase':<16}" + "".join(f"{m + ' p50':>12}{m + ' p95':>12}" for m in modes))
+    for k in STAGES:
+        fmt = (lambda v: f"{v:>12.0f}") if k.endswith("_calls") else (lambda v: f"{v:>12.3f}")
+        print(f"{k:<16}" + "".join(fmt(agg[m][k]["p50"]) + fmt(agg[m][k]["p95"]) for m in modes))
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--count", type=int, default=5, help="Processi per modalità (cold e warm)")
+    ap.add_argument("--cloud", default="microstack", help="Nome del cloud in clouds.yaml")
+    ap.add_argument("--keypair", default=os.environ.get("DEPLOYVM_KEYPAIR", "lab-key"))
+    ap.add_argument("--fake", action="store_true", help="Discovery sul cloud finto, senza Keystone")
+    ap.add_argument("--json", help="Scrive run grezzi e aggregati in questo file")
+    args = ap.parse_args()
+
+    results = {mode: bench(args, mode) for mode in ("cold", "warm")}
+    agg = {mode: summarize(runs) for mode, runs in results.items()}
+    print_table(agg)
+    if any(r["sdk_loaded_at_import"] for runs in results.values() for r in runs):
+        print("[!] L'SDK viene ancora caricato all'import di deploy_secure_vm", file=sys.stderr)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"fake": args.fake, "count": args.count, "aggregate": agg, "runs": results}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
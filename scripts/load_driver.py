@@ -0,0 +1,372 @@
+#!/usr/bin/env python3
+"""Driver di carico a ciclo chiuso per i guest del gruppo (sostituisce split_after_scale.sh nei benchmark).
+
+Per ogni host apre una sessione SSH persistente (un solo `sh` remoto) e avvia
+un worker duty-cycle per vCPU: in ogni periodo `yes` gira per `on` secondi e
+dorme per `off`. A ogni passo di controllo il driver legge /proc/stat sulla
+stessa sessione, confronta la CPU ottenuta col target del profilo e corregge
+il duty cycle (PI con feed-forward), così il carico reale segue il target
+anche con il rumore di fondo del guest.
+
+Profili (come simulate_autoscaler.py): constant:V | step:LOW,HIGH,T0,T1 |
+ramp:FROM,TO,T0,T1 | sine:MEAN,AMP,PERIOD | burst:BASE,PEAK,EVERY,LEN, oppure
+--trace CSV `t,valore`. Di default il valore è la CPU target di ogni host;
+con --split è la domanda totale in % di una VM, divisa tra gli host presenti
+(come nel simulatore: un nuovo clone dimezza il carico per host).
+
+Con --group gli host sono la VM base e i suoi cloni (scoperti via OpenStack e
+seguiti durante il run); con --host NOME=IP la lista è fissa. --events legge il
+log JSON lines di autoscale_watch.py --event-log e registra le decisioni del
+controller nel CSV accanto al carico.
+
+Esempi:
+  python3 scripts/load_driver.py --group VM-test_1 --split --profile step:40,180,60,900 \\
+      --events events.jsonl --csv load.csv --duration 1200
+  python3 scripts/load_driver.py --host vm1=10.20.20.11 --profile sine:50,30,300
+  python3 scripts/load_driver.py --group VM-test_1 --stop
+"""
+import argparse, csv, json, os, select, subprocess, sys, threading, time
+
+import autoscale_watch as aw
+from simulate_autoscaler import load_trace, parse_profile
+
+STATE = "/tmp/loaddrv.duty"         # "on off" in microsecondi, letto dai worker a ogni periodo
+PIDS = "/tmp/loaddrv.pids"
+SENTINEL = "__loaddrv_end__"
+
+# BusyBox ash: un worker per vCPU, termina quando STATE sparisce. Il `sleep` di
+# BusyBox può accettare solo interi: usleep se c'è (come STREAM_CMD di autoscale_watch)
+START_SCRIPT = """
+rm -f {state}; [ -f {pids} ] && while read p; do kill $p 2>/dev/null; done < {pids}; rm -f {pids}
+echo "0 {period_us}" > {state}
+N=$(grep -c ^processor /proc/cpuinfo); [ "$N" -ge 1 ] 2>/dev/null || N=1
+i=0
+while [ $i -lt $N ]; do
+  nohup sh -c 'if usleep 1 2>/dev/null; then nap() {{ usleep $1; }}
+    else nap() {{ sleep $(($1 / 1000000)).$(printf %06d $(($1 % 1000000))); }}; fi
+    while [ -f {state} ]; do read on off < {state} || break
+    if [ "$on" != 0 ]; then yes > /dev/null & p=$!; nap $on; kill $p 2>/dev/null; wait $p 2>/dev/null; fi
+    [ "$off" != 0 ] && nap $off; done' > /dev/null 2>&1 &
+  echo $! >> {pids}; i=$((i + 1))
+done
+echo $N
+"""
+
+# Ferma anche i carichi lasciati da split_after_scale.sh (PID file e `yes` orfani)
+STOP_SCRIPT = """
+rm -f {state}
+for f in {pids} /tmp/loadgen100.pid /tmp/loadgen50.pid; do
+  [ -f $f ] && while read p; do [ -n "$p" ] && kill $p 2>/dev/null; done < $f; rm -f $f
+done
+if command -v killall > /dev/null 2>&1; then killall -q yes 2>/dev/null; else
+  for p in $(ps w 2>/dev/null | awk '/(^|[ \\/])yes( |$)/{{print $1}}'); do kill -9 $p 2>/dev/null; done; fi
+true
+"""
+
+def _usecs(x):
+    return "0" if x < 0.001 else str(int(x * 1e6))
+
+def _cpu_times(line):
+    vals = list(map(int, line.split()[1:]))
+    return sum(vals), vals[3] + vals[4]
+
+class LoadSession:
+    """Sessione SSH persistente verso un host: comandi in un `sh` remoto, una riga sentinella per risposta."""
+
+    def __init__(self, host, key_path, period=0.2, timeout=10.0):
+        self.host = host
+        self.period = period
+        self.timeout = timeout
+        self.proc = subprocess.Popen(aw._ssh_opts(host, key_path) + ["sh"], stdin=subprocess.PIPE,
+                                     stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, bufsize=0)
+        self.buf = b""          # letture raw: select() non vede il buffer di readline()
+        self.ncpu = None
+        self.last = None        # (total, idle) dell'ultima lettura di /proc/stat
+
+    def run(self, script):
+        """Esegue script nel sh remoto e ritorna le righe di output."""
+        if self.proc.poll() is not None:
+            raise RuntimeError(f"sessione SSH verso {self.host} chiusa")
+        self.proc.stdin.write((script.strip() + f"\necho {SENTINEL}\n").encode())
+        deadline = time.monotonic() + self.timeout
+        end = f"{SENTINEL}\n".encode()
+        while end not in self.buf:
+            left = deadline - time.monotonic()
+            if left <= 0 or not select.select([self.proc.stdout], [], [], left)[0]:
+                raise RuntimeError(f"timeout sulla sessione SSH verso {self.host}")
+            chunk = os.read(self.proc.stdout.fileno(), 65536)
+            if not chunk:
+                raise RuntimeError(f"sessione SSH verso {self.host} chiusa")
+            self.buf += chunk
+        out, _, self.buf = self.buf.partition(end)
+        return out.decode(errors="replace").splitlines()
+
+    def start(self):
+        self.ncpu = int(self.run(START_SCRIPT.format(state=STATE, pids=PIDS, period_us=int(self.period * 1e6)))[-1])
+        return self.ncpu
+
+    def step(self, duty):
+        """Imposta il duty cycle e ritorna la CPU% dall'ultimo passo (None al primo)."""
+        on = self.period * duty
+        out = self.run(f'echo "{_usecs(on)} {_usecs(self.period - on)}" > {STATE}; grep "^cpu " /proc/stat')
+        total, idle = _cpu_times(out[-1])
+        prev, self.last = self.last, (total, idle)
+        if prev is None or total <= prev[0]:
+            return None
+        return (1 - (idle - prev[1]) / (total - prev[0])) * 100
+
+    def stop(self):
+        try:
+            self.run(STOP_SCRIPT.format(state=STATE, pids=PIDS))
+        finally:
+            self.close()
+
+    def close(self):
+        try:
+            self.proc.stdin.close()
+            self.proc.wait(timeout=5)
+        except Exception:
+            self.proc.kill()
+
+class DutyController:
+    """PI sul duty cycle: feed-forward target/100, correzione sull'errore target - ottenuto."""
+
+    def __init__(self, kp=0.6, ki=0.3):
+        self.kp = kp
+        self.ki = ki
+        self.integral = 0.0
+
+    def update(self, target, achieved, dt):
+        if achieved is None:
+            return min(1.0, max(0.0, target / 100))
+        err = (target - achieved) / 100
+        # anti-windup: l'integrale resta nel range utile del duty
+        self.integral = min(1.0, max(-1.0, self.integral + self.ki * err * dt))
+        return min(1.0, max(0.0, target / 100 + self.kp * err + self.integral))
+
+# ------------------------
+# Host ed eventi
+# ------------------------
+class GroupHosts:
+    """VM base + cloni ACTIVE con FIP, da un solo listing (ServerInventory) invece di un `server show` per VM."""
+
+    def __init__(self, group, ttl=10.0):
+        self.group = group
+        self.inv = aw.ServerInventory(aw.deployer.connect(), ttl=ttl)
+
+    def __call__(self):
+        self.inv.refresh()
+        out = {}
+        for s in self.inv.list():
+            name = s.name or ""
+            if (name == self.group or aw._is_clone_of(self.group, name)) \
+                    and getattr(s, "status", "").upper() == "ACTIVE" and self.inv.fip(s):
+                out[name] = self.inv.fip(s)
+        return out
+
+class EventTail:
+    """Legge le righe nuove del log eventi del controller (--event-log), partendo dalla fine."""
+
+    def __init__(self, path):
+        self.f = open(path, "a+")
+        self.f.seek(0, os.SEEK_END)
+
+    def poll(self):
+        out = []
+        for line in self.f.readlines():
+            try:
+                out.append(json.loads(line))
+            except ValueError:
+                continue
+        return out
+
+# ------------------------
+# Driver
+# ------------------------
+class LoadDriver:
+    def __init__(self, target, hosts_fn, key_path, split=False, period=0.2, step=1.0, kp=0.6, ki=0.3,
+                 discover_every=10.0, writer=None, events=None, host_targets=None):
+        self.target = target            # t -> valore del profilo
+        self.host_targets = host_targets or {}      # nome -> profilo proprio (CPU% dell'host, mai diviso)
+        self.hosts_fn = hosts_fn
+        self.key_path = key_path
+        self.split = split
+        self.period = period
+        self.step_s = step
+        self.kp, self.ki = kp, ki
+        self.discover_every = discover_every
+        self.writer = writer
+        self.events = events
+        self.sessions = {}              # nome -> (LoadSession, DutyController)
+        self.duty = {}
+        self.errors = {}                # nome -> [|target - ottenuto|]
+        self.lock = threading.Lock()
+
+    def discover(self):
+        hosts = self.hosts_fn()
+        for name in [n for n in self.sessions if n not in hosts]:
+            print(f"[-] Host sparito: {name}, chiudo la sessione")
+            self.sessions.pop(name)[0].close()
+        for name, ip in hosts.items():
+            if name in self.sessions:
+                continue
+            try:
+                sess = LoadSession(ip, self.key_path, period=self.period)
+                ncpu = sess.start()
+            except Exception as e:
+                print(f"[!] {name} @ {ip}: sessione non avviata ({e}), riprovo alla prossima discovery")
+                continue
+            self.sessions[name] = (sess, DutyController(self.kp, self.ki))
+            self.duty[name] = 0.0
+            print(f"[+] {name} @ {ip}: {ncpu} worker duty-cycle avviati")
+
+    def _host_target(self, name, t):
+        if name in self.host_targets:
+            return min(100.0, max(0.0, self.host_targets[name](t)))
+        v = max(0.0, self.target(t))
+        n = len([h for h in self.sessions if h not in self.host_targets])
+        return min(100.0, v / n if self.split and n else v)
+
+    def _record(self, row):
+        if self.writer:
+            with self.lock:
+                self.writer.writerow(row)
+
+    def _drive(self, name, t, dt):
+        sess, ctl = self.sessions[name]
+        target = self._host_target(name, t)
+        achieved = sess.step(self.duty[name])
+        self.duty[name] = ctl.update(target, achieved, dt)
+        if achieved is not None:
+            self.errors.setdefault(name, []).append(abs(target - achieved))
+        self._record([f"{time.time():.3f}", f"{t:.1f}", name, f"{target:.1f}",
+                      "" if achieved is None else f"{achieved:.1f}", f"{self.duty[name]:.3f}", ""])
+        return achieved
+
+    def run(self, duration):
+        t0 = last_discover = time.monotonic()
+        self.discover()
+        last = t0
+        while True:
+            now = time.monotonic()
+            t = now - t0
+            if duration and t >= duration:
+                break
+            if now - last_discover >= self.discover_every:
+                self.discover(); last_discover = now
+            dt, last = now - last, now
+            names = list(self.sessions)
+            results = {}
+            # sessioni indipendenti: un passo per host in parallelo
+            threads = [threading.Thread(target=lambda n=n: results.__setitem__(n, self._safe_drive(n, t, dt)))
+                       for n in names]
+            for th in threads:
+                th.start()
+            for th in threads:
+                th.join()
+            for n in [n for n, r in results.items() if isinstance(r, Exception)]:
+                print(f"[!] {n}: {results[n]}; chiudo la sessione")
+                self.sessions.pop(n)[0].close()
+            for ev in (self.events.poll() if self.events else ()):
+                print(f"[event] {ev.get('event')} {ev.get('target')} (gruppo {ev.get('group')})")
+                self._record([f"{ev.get('time', time.time()):.3f}", f"{t:.1f}", ev.get("target", ""), "", "", "",
+                              ev.get("event", "")])
+            shown = " ".join(f"{n}={self._shown(results.get(n))}/{self._host_target(n, t):.0f}%"
+                             f"(d={self.duty.get(n, 0):.2f})" for n in names if n in self.sessions)
+            print(f"[load] t={t:.0f}s ottenuto/target {shown or '(nessun host)'}")
+            time.sleep(max(0.0, self.step_s - (time.monotonic() - now)))
+
+    def _safe_drive(self, name, t, dt):
+        try:
+            return self._drive(name, t, dt)
+        except Exception as e:
+            return e
+
+    @staticmethod
+    def _shown(r):
+        return "-" if r is None or isinstance(r, Exception) else f"{r:.0f}"
+
+    def stop(self):
+        for name, (sess, _) in list(self.sessions.items()):
+            try:
+                sess.stop()
+            except Exception as e:
+                print(f"[!] Stop su {name} fallito: {e}")
+        self.sessions.clear()
+
+    def summary(self):
+        for name, errs in sorted(self.errors.items()):
+            errs = sorted(errs)
+            print(f"[i] {name}: errore medio {sum(errs) / len(errs):.1f} punti, "
+                  f"p95 {errs[int(0.95 * (len(errs) - 1))]:.1f} su {len(errs)} passi")
+
+def _static_hosts(specs):
+    hosts = {}
+    for spec in specs:
+        name, sep, ip = spec.partition("=")
+        hosts[name if sep else spec] = ip if sep else spec
+    return lambda: hosts
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    who = ap.add_mutually_exclusive_group(required=True)
+    who.add_argument("--group", help="VM base: carico su base e cloni, seguiti durante il run")
+    who.add_argument("--host", action="append", help="Host fisso NOME=IP (ripetibile)")
+    src = ap.add_mutually_exclusive_group()
+    src.add_argument("--profile", default="constant:60", help="Profilo del target (vedi sopra)")
+    src.add_argument("--trace", help="CSV t,valore registrato (ripetuto in loop)")
+    ap.add_argument("--host-profile", action="append", default=[], metavar="NOME=PROFILO",
+                    help="Profilo proprio di un host (CPU%% dell'host, escluso da --split); ripetibile")
+    ap.add_argument("--split", action="store_true",
+                    help="Il profilo è la domanda totale in %% di una VM, divisa tra gli host presenti")
+    ap.add_argument("--duration", type=float, default=0, help="Secondi di carico (0 = fino a Ctrl-C)")
+    ap.add_argument("--step", type=float, default=1.0, help="Passo del controllo ad anello chiuso (s)")
+    ap.add_argument("--period", type=float, default=0.2, help="Periodo del duty cycle nei guest (s)")
+    ap.add_argument("--kp", type=float, default=0.6, help="Guadagno proporzionale del controllo")
+    ap.add_argument("--ki", type=float, default=0.3, help="Guadagno integrale del controllo (1/s)")
+    ap.add_argument("--discover-every", type=float, default=10.0, help="(--group) Secondi tra due discovery")
+    ap.add_argument("--events", metavar="PATH", help="Log JSON lines di autoscale_watch.py --event-log da seguire")
+    ap.add_argument("--csv", help="Scrive target/ottenuto/duty per host ed eventi del controller in questo CSV")
+    ap.add_argument("--stop", action="store_true", help="Ferma i carichi sugli host (anche quelli di split_after_scale.sh)")
+    ap.add_argument("--ssh-key-path", default=os.environ.get("AUTOSCALE_SSH_KEY", "~/.ssh/lab-key-rsa"))
+    args = ap.parse_args()
+
+    hosts_fn = GroupHosts(args.group) if args.group else _static_hosts(args.host)
+    if args.stop:
+        for name, ip in hosts_fn().items():
+            try:
+                LoadSession(ip, args.ssh_key_path).stop()
+                print(f"[+] Carico fermato su {name} @ {ip}")
+            except Exception as e:
+                print(f"[!] {name} @ {ip}: {e}")
+        return
+
+    try:
+        target = load_trace(args.trace)[0] if args.trace else parse_profile(args.profile)
+        host_targets = {}
+        for spec in args.host_profile:
+            name, sep, prof = spec.partition("=")
+            if not sep:
+                raise ValueError(f"--host-profile atteso NOME=PROFILO, ricevuto {spec}")
+            host_targets[name] = parse_profile(prof)
+    except (ValueError, OSError) as e:
+        print(f"[!] {e}", file=sys.stderr); sys.exit(2)
+    f = open(args.csv, "w", newline="") if args.csv else None
+    writer = csv.writer(f) if f else None
+    if writer:
+        writer.writerow(["time", "t_s", "host", "target_pct", "achieved_pct", "duty", "event"])
+    drv = LoadDriver(target, hosts_fn, args.ssh_key_path, split=args.split, period=args.period, step=args.step,
+                     kp=args.kp, ki=args.ki, discover_every=args.discover_every, writer=writer,
+                     events=EventTail(args.events) if args.events else None, host_targets=host_targets)
+    try:
+        drv.run(args.duration)
+    except KeyboardInterrupt:
+        print("[+] Interrotto dall'utente")
+    finally:
+        drv.stop()
+        drv.summary()
+        if f:
+            f.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,504 @@
+#!/usr/bin/env python3
+# Cloud finto + clock virtuale per simulare autoscale_watch/deploy_secure_vm senza MicroStack.
+import itertools, random, threading, uuid
+from datetime import datetime, timezone
+
+EPOCH = 1_750_000_000.0     # istante "zero" del tempo simulato (solo per timestamp leggibili)
+
+# ------------------------
+# Clock virtuale
+# ------------------------
+class VirtualClock:
+    """Tempo simulato condiviso da ciclo di controllo e thread delle azioni.
+
+    Espone time()/monotonic()/sleep() come il modulo `time`. Il tempo avanza solo
+    con advance_to(), e solo quando tutti i thread registrati (SimExecutor) sono
+    fermi in sleep() o terminati: la simulazione resta deterministica anche con
+    le azioni in background.
+    """
+
+    def __init__(self, start=0.0, stall_timeout=30.0):
+        self.now = start
+        self.cond = threading.Condition()
+        self.busy = 0               # thread registrati che stanno lavorando (non in sleep)
+        self.sleepers = []          # [target, evento] dei thread in sleep
+        self.stall_timeout = stall_timeout
+
+    def time(self):
+        return EPOCH + self.now
+
+    def monotonic(self):
+        return self.now
+
+    def register(self):
+        with self.cond:
+            self.busy += 1
+
+    def unregister(self):
+        with self.cond:
+            self.busy -= 1
+            self.cond.notify_all()
+
+    def sleep(self, dt):
+        with self.cond:
+            slot = [self.now + max(0.0, dt), False]
+            self.sleepers.append(slot)
+            self.busy -= 1
+            self.cond.notify_all()
+            while not slot[1]:
+                self.cond.wait()
+
+    def _settle(self):
+        if not self.cond.wait_for(lambda: self.busy <= 0, timeout=self.stall_timeout):
+            raise RuntimeError("simulazione bloccata: un thread non torna mai in sleep()")
+
+    def advance_to(self, t):
+        """Porta il tempo a t svegliando, in ordine, chi dorme fino a quell'istante."""
+        with self.cond:
+            self._settle()
+            while True:
+                due = [s for s in self.sleepers if s[0] <= t]
+                if not due:
+                    break
+                # un passo alla volta: chi si sveglia può riaddormentarsi prima di t
+                step = min(s[0] for s in due)
+                self.now = max(self.now, step)
+                for s in [s for s in due if s[0] <= step]:
+                    self.sleepers.remove(s)
+                    s[1] = True
+                    self.busy += 1
+                self.cond.notify_all()
+                self._settle()
+            self.now = max(self.now, t)
+
+class SteppingClock:
+    """Clock per un solo thread: sleep() fa avanzare il tempo all'istante (benchmark sul cloud finto)."""
+
+    def __init__(self, start=0.0):
+        self.now = start
+
+    def time(self):
+        return EPOCH + self.now
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, dt):
+        self.now += max(0.0, dt)
+
+class SimExecutor:
+    """Executor compatibile con ThreadPoolExecutor.submit/shutdown, con thread registrati sul VirtualClock."""
+
+    def __init__(self, clock):
+        self.clock = clock
+
+    def submit(self, fn, *args, **kw):
+        from concurrent.futures import Future
+        fut = Future()
+        self.clock.register()
+
+        def run():
+            try:
+                if fut.set_running_or_notify_cancel():
+                    try:
+                        fut.set_result(fn(*args, **kw))
+                    except BaseException as e:
+                        fut.set_exception(e)
+            finally:
+                self.clock.unregister()
+        threading.Thread(target=run, daemon=True).start()
+        return fut
+
+    def shutdown(self, wait=False):
+        pass
+
+# ------------------------
+# Risorse finte
+# ------------------------
+class NotFound(LookupError):
+    """Senza openstacksdk: il deployer intercetta i not-found come LookupError."""
+
+try:
+    from openstack.exceptions import ResourceNotFound as NotFound  # stessa eccezione dell'SDK, se c'è
+except ImportError:
+    pass
+
+class FakeResource:
+    def __init__(self, **attrs):
+        self.__dict__.update(attrs)
+
+    def __repr__(self):
+        return f"<{getattr(self, 'name', None) or self.id}>"
+
+def _iso(clock, t=None):
+    ts = clock.time() if t is None else t
+    return datetime.fromtimestamp(ts, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+class FakeCloud:
+    """Stato condiviso del cloud finto. Latenze in secondi di tempo (virtuale o reale)."""
+
+    def __init__(self, clock, boot_latency=60.0, boot_jitter=0.0, port_latency=5.0,
+                 delete_latency=5.0, snapshot_latency=30.0, fail_rate=0.0, seed=0,
+                 guest_latency=20.0, snapshot_guest_latency=None, image_fetch_latency=0.0):
+        self.clock = clock
+        self.boot_latency = boot_latency
+        self.guest_latency = guest_latency                  # ACTIVE -> SSH pronto (boot del guest)
+        self.snapshot_guest_latency = guest_latency if snapshot_guest_latency is None else snapshot_guest_latency
+        self.image_fetch_latency = image_fetch_latency      # primo boot di un'immagine non in cache sul compute
+        self.cached_images = {"img-cirros"}
+        self.boot_jitter = boot_jitter
+        self.port_latency = port_latency
+        self.delete_latency = delete_latency
+        self.snapshot_latency = snapshot_latency
+        self.fail_rate = fail_rate
+        self.rnd = random.Random(seed)
+        self.lock = threading.RLock()
+        self.servers = {}
+        self.deleted = {}           # id -> server, per changes-since
+        self.ips = {}
+        self.images = {}
+        self.calls = 0              # chiamate API totali
+        self._ip_seq = itertools.count(10)
+        self.external = FakeResource(id="ext-net", name="external")
+        self.networks = {"external": self.external}
+        self.subnets = {}
+        self.routers = {}
+        self.secgroups = {}
+        self.sg_rules = []
+        self.keypairs = {"lab-key": FakeResource(id="lab-key", name="lab-key")}
+        self.flavors = {"m1.tiny": FakeResource(id="flv-tiny", name="m1.tiny")}
+        self.images["cirros"] = FakeResource(id="img-cirros", name="cirros", status="active", tags=[],
+                                             created_at=_iso(clock, EPOCH - 86400), stores="file")
+
+    def new_id(self):
+        return str(uuid.UUID(int=self.rnd.getrandbits(128)))
+
+    def tick(self):
+        """Applica le transizioni di stato dovute all'istante corrente."""
+        now = self.clock.time()
+        for s in list(self.servers.values()):
+            if s._delete_at is not None and now >= s._delete_at:
+                del self.servers[s.id]
+                s.status = "DELETED"; s.updated_at = _iso(self.clock)
+                self.deleted[s.id] = s
+                for f in self.ips.values():
+                    if f.port_id == s._port_id:
+                        f.port_id = None; f.status = "DOWN"
+                continue
+            if s.status == "BUILD" and now >= s._active_at:
+                s.status = "ERROR" if s._fail else "ACTIVE"
+                s.updated_at = _iso(self.clock)
+        for im in self.images.values():
+            if im.status == "queued" and now >= im._active_at:
+                im.status = "active"
+
+    def refresh_addresses(self, s):
+        fips = [f for f in self.ips.values() if f.port_id and f.port_id == s._port_id]
+        s.addresses = {"lab-net": [{"addr": s._fixed, "OS-EXT-IPS:type": "fixed"}] +
+                       [{"addr": f.floating_ip_address, "OS-EXT-IPS:type": "floating"} for f in fips]}
+
+class _Proxy:
+    def __init__(self, cloud):
+        self.cloud = cloud
+
+    def _call(self):
+        with self.cloud.lock:
+            self.cloud.calls += 1
+            self.cloud.tick()
+
+class FakeCompute(_Proxy):
+    def servers(self, details=True, changes_since=None, **filters):
+        self._call()
+        with self.cloud.lock:
+            out = list(self.cloud.servers.values())
+            if changes_since:
+                out = [s for s in out if s.updated_at >= changes_since]
+                out += [s for s in self.cloud.deleted.values() if s.updated_at >= changes_since]
+            for s in out:
+                if s.status != "DELETED":
+                    self.cloud.refresh_addresses(s)
+            return list(out)
+
+    def get_server(self, server):
+        self._call()
+        sid = getattr(server, "id", server)
+        with self.cloud.lock:
+            s = self.cloud.servers.get(sid)
+            if not s:
+                raise NotFound(f"server {sid}")
+            self.cloud.refresh_addresses(s)
+            return s
+
+    def find_server(self, name_or_id, ignore_missing=True):
+        self._call()
+        with self.cloud.lock:
+            for s in self.cloud.servers.values():
+                if s.name == name_or_id or s.id == name_or_id:
+                    self.cloud.refresh_addresses(s)
+                    return s
+        if not ignore_missing:
+            raise NotFound(name_or_id)
+        return None
+
+    def create_server(self, name, image_id, flavor_id, networks, key_name=None, security_groups=None,
+                      config_drive=False, **kw):
+        self._call()
+        c = self.cloud
+        with c.lock:
+            now = c.clock.time()
+            boot = c.boot_latency + (c.rnd.uniform(-c.boot_jitter, c.boot_jitter) if c.boot_jitter else 0.0)
+            if image_id not in c.cached_images:
+                boot += c.image_fetch_latency
+                c.cached_images.add(image_id)
+            img = c.images.get(image_id)
+            guest = c.snapshot_guest_latency if img is not None and img.tags else c.guest_latency
+            sid = c.new_id()
+            s = FakeResource(id=sid, name=name, status="BUILD", image_id=image_id, flavor_id=flavor_id,
+                             key_name=key_name, metadata={}, created_at=_iso(c.clock), updated_at=_iso(c.clock),
+                             addresses={}, _active_at=now + max(1.0, boot), _port_at=now + c.port_latency,
+                             _ssh_at=now + max(1.0, boot) + guest,
+                             _delete_at=None, _fail=c.rnd.random() < c.fail_rate,
+                             _port_id=f"port-{sid[:8]}", _fixed=f"192.168.100.{10 + len(c.servers)}")
+            c.servers[sid] = s
+            return s
+
+    def delete_server(self, server, ignore_missing=True, **kw):
+        self._call()
+        sid = getattr(server, "id", server)
+        with self.cloud.lock:
+            s = self.cloud.servers.get(sid)
+            if not s:
+                if not ignore_missing:
+                    raise NotFound(sid)
+                return None
+            if s._delete_at is None:
+                s._delete_at = self.cloud.clock.time() + self.cloud.delete_latency
+                s.updated_at = _iso(self.cloud.clock)
+
+    def update_server(self, server, **attrs):
+        s = self.get_server(server)
+        with self.cloud.lock:
+            s.__dict__.update(attrs); s.updated_at = _iso(self.cloud.clock)
+            return s
+
+    def set_server_metadata(self, server, **metadata):
+        s = self.get_server(server)
+        s.metadata.update(metadata)
+        return s
+
+    def wait_for_server(self, server, status="ACTIVE", failures=None, interval=2, wait=120):
+        deadline = self.cloud.clock.time() + wait
+        while True:
+            s = self.get_server(server)
+            if s.status == status:
+                return s
+            if s.status in (failures or []):
+                raise RuntimeError(f"VM status={s.status}")
+            if self.cloud.clock.time() >= deadline:
+                raise TimeoutError("wait_for_server")
+            self.cloud.clock.sleep(interval)
+
+    def find_flavor(self, name, ignore_missing=True):
+        self._call()
+        return self.cloud.flavors.get(name)
+
+    def find_keypair(self, name, ignore_missing=True):
+        self._call()
+        return self.cloud.keypairs.get(name)
+
+    def create_keypair(self, name, public_key):
+        self._call()
+        kp = self.cloud.keypairs[name] = FakeResource(id=name, name=name, public_key=public_key)
+        return kp
+
+    def create_server_image(self, server, name, metadata=None, **kw):
+        self._call()
+        c = self.cloud
+        with c.lock:
+            iid = c.new_id()
+            im = FakeResource(id=iid, name=name, status="queued", tags=[], created_at=_iso(c.clock),
+                              properties=dict(metadata or {}), stores="file",
+                              _active_at=c.clock.time() + c.snapshot_latency)
+            c.images[iid] = im
+            return im
+
+class FakeNetwork(_Proxy):
+    def _find(self, table, name, ignore_missing=True):
+        self._call()
+        r = table.get(name)
+        if not r:
+            r = next((x for x in table.values() if x.id == name), None)
+        if not r and not ignore_missing:
+            raise NotFound(name)
+        return r
+
+    def find_network(self, name, ignore_missing=True):
+        return self._find(self.cloud.networks, name, ignore_missing)
+
+    def create_network(self, name):
+        self._call()
+        n = self.cloud.networks[name] = FakeResource(id=f"net-{name}", name=name)
+        return n
+
+    def find_subnet(self, name, ignore_missing=True):
+        return self._find(self.cloud.subnets, name, ignore_missing)
+
+    def create_subnet(self, name, **kw):
+        self._call()
+        sn = self.cloud.subnets[name] = FakeResource(id=f"subnet-{name}", name=name, **kw)
+        return sn
+
+    def find_router(self, name, ignore_missing=True):
+        return self._find(self.cloud.routers, name, ignore_missing)
+
+    def create_router(self, name):
+        self._call()
+        r = self.cloud.routers[name] = FakeResource(id=f"router-{name}", name=name,
+                                                    external_gateway_info=None, _ifaces=set())
+        return r
+
+    def update_router(self, router, **attrs):
+        self._call()
+        router.__dict__.update(attrs)
+        return router
+
+    def add_interface_to_router(self, router, subnet_id=None, **kw):
+        self._call()
+        if subnet_id in router._ifaces:
+            raise RuntimeError("interfaccia già presente")
+        router._ifaces.add(subnet_id)
+
+    def find_security_group(self, name, ignore_missing=True):
+        return self._find(self.cloud.secgroups, name, ignore_missing)
+
+    def create_security_group(self, name):
+        self._call()
+        sg = self.cloud.secgroups[name] = FakeResource(id=f"sg-{name}", name=name)
+        return sg
+
+    def security_group_rules(self, security_group_id=None, **kw):
+        self._call()
+        return [r for r in self.cloud.sg_rules if r.security_group_id == security_group_id]
+
+    def create_security_group_rule(self, **attrs):
+        self._call()
+        r = FakeResource(id=self.cloud.new_id(), **attrs)
+        self.cloud.sg_rules.append(r)
+        return r
+
+    def ips(self, **filters):
+        self._call()
+        with self.cloud.lock:
+            return [f for f in self.cloud.ips.values()
+                    if all(getattr(f, k, None) == v for k, v in filters.items())]
+
+    def create_ip(self, floating_network_id, **attrs):
+        self._call()
+        c = self.cloud
+        with c.lock:
+            n = next(c._ip_seq)
+            f = FakeResource(id=c.new_id(), floating_ip_address=f"10.20.20.{n % 250 + 2}",
+                             floating_network_id=floating_network_id, port_id=None, status="DOWN",
+                             description=attrs.get("description", ""))
+            c.ips[f.id] = f
+            return f
+
+    def get_ip(self, fip):
+        self._call()
+        f = self.cloud.ips.get(getattr(fip, "id", fip))
+        if not f:
+            raise NotFound(fip)
+        return f
+
+    def update_ip(self, fip, port_id=None, **attrs):
+        self._call()
+        with self.cloud.lock:
+            f = self.cloud.ips[getattr(fip, "id", fip)]
+            f.port_id = port_id; f.status = "ACTIVE" if port_id else "DOWN"
+            f.__dict__.update(attrs)
+            return f
+
+    def delete_ip(self, fip, ignore_missing=True):
+        self._call()
+        with self.cloud.lock:
+            if self.cloud.ips.pop(getattr(fip, "id", fip), None) is None and not ignore_missing:
+                raise NotFound(fip)
+
+    def ports(self, device_id=None, **filters):
+        self._call()
+        now = self.cloud.clock.time()
+        # come Neutron: un filtro ripetuto (lista) vale come OR
+        ids = None if device_id is None else {device_id} if isinstance(device_id, str) else set(device_id)
+        with self.cloud.lock:
+            out = []
+            for s in self.cloud.servers.values():
+                if (ids is None or s.id in ids) and now >= s._port_at:
+                    out.append(FakeResource(id=s._port_id, device_id=s.id))
+            return out
+
+class FakeImage(_Proxy):
+    def find_image(self, name_or_id, ignore_missing=True):
+        self._call()
+        with self.cloud.lock:
+            for im in self.cloud.images.values():
+                if im.name == name_or_id or im.id == name_or_id:
+                    return im
+        if not ignore_missing:
+            raise NotFound(name_or_id)
+        return None
+
+    def get_image(self, image):
+        self._call()
+        im = self.cloud.images.get(getattr(image, "id", image))
+        if not im:
+            raise NotFound(image)
+        return im
+
+    def images(self, tag=None, name=None, status=None, sort_key=None, sort_dir="desc", limit=None, id=None, **kw):
+        self._call()
+        # come Glance: id=in:a,b,c
+        ids = None if id is None else set(id[3:].split(",")) if id.startswith("in:") else {id}
+        with self.cloud.lock:
+            out = [im for im in self.cloud.images.values()
+                   if (ids is None or im.id in ids)
+                   and (tag is None or tag in im.tags) and (name is None or im.name == name)
+                   and (status is None or im.status == status)]
+        if sort_key:
+            out.sort(key=lambda im: getattr(im, sort_key, "") or "", reverse=(sort_dir == "desc"))
+        return out[:limit] if limit else out
+
+    def add_tag(self, image, tag):
+        im = self.get_image(image)
+        if tag not in im.tags:
+            im.tags.append(tag)
+
+    def delete_image(self, image, ignore_missing=True):
+        self._call()
+        with self.cloud.lock:
+            if self.cloud.images.pop(getattr(image, "id", image), None) is None and not ignore_missing:
+                raise NotFound(image)
+
+class FakeConnection:
+    """Sottoinsieme di openstack.connection.Connection usato dagli script del repo."""
+
+    def __init__(self, clock, **latencies):
+        self.cloud = FakeCloud(clock, **latencies)
+        self.compute = FakeCompute(self.cloud)
+        self.network = FakeNetwork(self.cloud)
+        self.image = FakeImage(self.cloud)
+
+    def add_server(self, name, status="ACTIVE", with_fip=True):
+        """Crea direttamente una VM già pronta (es. la base del gruppo)."""
+        s = self.compute.create_server(name=name, image_id="img-cirros", flavor_id="flv-tiny", networks=[])
+        s.status = status; s._active_at = s._port_at = s._ssh_at = self.cloud.clock.time()
+        if with_fip:
+            f = self.network.create_ip(floating_network_id=self.cloud.external.id)
+            self.network.update_ip(f, port_id=s._port_id)
+        return s
+
+    def guest_ready(self, server):
+        """True quando il guest risponderebbe via SSH (sostituisce la sonda SSH nei benchmark)."""
+        with self.cloud.lock:
+            self.cloud.tick()
+            s = self.cloud.servers.get(getattr(server, "id", server))
+            return s is not None and s.status == "ACTIVE" and self.cloud.clock.time() >= s._ssh_at
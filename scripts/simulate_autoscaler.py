@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""Simulazione offline del ciclo di controllo di autoscale_watch.py.
+
+Il vero ReplicaSet (policy, azioni in background, inventario, deployer) gira
+contro un cloud finto (openstack_sim.FakeConnection) in tempo virtuale, con
+carico sintetico o da trace registrata. Le opzioni non riconosciute qui sono
+passate al parser di autoscale_watch.py (es. --policy, --high, --max-replicas).
+
+Esempi:
+  python3 scripts/simulate_autoscaler.py --profile step:40,260,600,3600 --duration 7200
+  python3 scripts/simulate_autoscaler.py --trace week.csv --compare hits,ewma,percentile --high 75
+"""
+import argparse, contextlib, csv, json, math, os, random, sys, time
+
+import autoscale_watch as aw
+from autoscale_watch import ReplicaSet, ServerInventory, deployer, _is_clone_of
+from openstack_sim import FakeConnection, SimExecutor, VirtualClock
+
+# ------------------------
+# Sorgenti di carico: domanda totale in % di una VM (150 = una VM e mezza)
+# ------------------------
+def parse_profile(spec):
+    """constant:V | step:LOW,HIGH,T0,T1 | ramp:FROM,TO,T0,T1 | sine:MEAN,AMP,PERIOD | burst:BASE,PEAK,EVERY,LEN"""
+    kind, _, rest = spec.partition(":")
+    p = [float(x) for x in rest.split(",")] if rest else []
+    if kind == "constant":
+        return lambda t: p[0]
+    if kind == "step":
+        lo, hi, t0, t1 = p
+        return lambda t: hi if t0 <= t < t1 else lo
+    if kind == "ramp":
+        a, b, t0, t1 = p
+        return lambda t: a if t < t0 else b if t >= t1 else a + (b - a) * (t - t0) / (t1 - t0)
+    if kind == "sine":
+        mean, amp, period = p
+        return lambda t: mean + amp * math.sin(2 * math.pi * t / period)
+    if kind == "burst":
+        base, peak, every, length = p
+        return lambda t: peak if (t % every) < length else base
+    raise ValueError(f"profilo sconosciuto: {spec}")
+
+def load_trace(path, loop=True):
+    """CSV `t,demand` (secondi, % di una VM); valori interpolati linearmente."""
+    pts = []
+    with open(path, newline="") as f:
+        for row in csv.reader(f):
+            try:
+                pts.append((float(row[0]), float(row[1])))
+            except (ValueError, IndexError):
+                continue        # header / righe non numeriche
+    if not pts:
+        raise ValueError(f"trace vuota: {path}")
+    pts.sort()
+    t0, span = pts[0][0], pts[-1][0] - pts[0][0]
+
+    def demand(t):
+        t = t0 + ((t % span) if loop and span > 0 else t)
+        lo, hi = 0, len(pts) - 1
+        if t <= pts[0][0]:
+            return pts[0][1]
+        if t >= pts[-1][0]:
+            return pts[-1][1]
+        while hi - lo > 1:
+            mid = (lo + hi) // 2
+            if pts[mid][0] <= t:
+                lo = mid
+            else:
+                hi = mid
+        (ta, va), (tb, vb) = pts[lo], pts[hi]
+        return va + (vb - va) * (t - ta) / (tb - ta)
+    return demand, span
+
+class SimSampler:
+    """Stessa interfaccia di SshSampler: la domanda è divisa tra le repliche campionabili."""
+
+    def __init__(self, demand, clock, noise=0.0, mem=10.0, seed=0):
+        self.demand = demand
+        self.clock = clock
+        self.noise = noise
+        self.mem = mem
+        self.rnd = random.Random(seed)
+
+    def utilization(self, n):
+        d = max(0.0, self.demand(self.clock.monotonic()))
+        return min(100.0, d / n) if n else 100.0
+
+    def sample(self, hosts):
+        u = self.utilization(len(hosts))
+        out = {}
+        for name, _ in hosts:
+            cpu = min(100.0, max(0.0, u + (self.rnd.gauss(0, self.noise) if self.noise else 0.0)))
+            out[name] = (cpu, self.mem, 0.0)
+        return out
+
+    def close(self, host):
+        pass
+
+# ------------------------
+# Harness
+# ------------------------
+def run_scenario(ctrl_args, demand, duration, latencies, noise=0.0, mem=10.0, seed=0, flap_window=600.0, quiet=True):
+    clock = VirtualClock()
+    conn = FakeConnection(clock, seed=seed, **latencies)
+    group = ctrl_args.server
+    conn.add_server(group)
+    inv = ServerInventory(conn, ttl=ctrl_args.inventory_ttl, full_every=ctrl_args.inventory_full_every, clock=clock)
+    sampler = SimSampler(demand, clock, noise=noise, mem=mem, seed=seed)
+    events = []
+    out = open(os.devnull, "w") if quiet else sys.stdout
+
+    with contextlib.redirect_stdout(out):
+        ctx = deployer.prepare_context(conn, ctrl_args.deploy_keypair, clock=clock)
+        rs = ReplicaSet(conn, ctrl_args, inv, ctx=ctx, sampler=sampler, clock=clock, executor=SimExecutor(clock))
+        rs.on_event = lambda kind, target: (kind in ("up", "down")
+                                            and events.append((clock.monotonic(), kind, target)))
+
+        stats = dict(ticks=0, time_over=0.0, replica_seconds=0.0, max_replicas=0)
+        episodes = []           # [inizio sovraccarico, prima decisione up, fine sovraccarico]
+        over_since = None
+        t = 0.0
+        interval = float(ctrl_args.interval)
+        while t <= duration:
+            clock.advance_to(t)
+            rs.run_once()
+            with conn.cloud.lock:
+                conn.cloud.tick()
+                members = [s for s in conn.cloud.servers.values()
+                           if s.name == group or _is_clone_of(group, s.name)]
+                serving = sum(1 for s in members if s.status == "ACTIVE" and s._delete_at is None)
+            util = sampler.utilization(serving)
+            stats["ticks"] += 1
+            stats["replica_seconds"] += len(members) * interval
+            stats["max_replicas"] = max(stats["max_replicas"], len(members))
+            if util >= ctrl_args.high:
+                stats["time_over"] += interval
+                if over_since is None:
+                    over_since = t
+                    episodes.append([t, None, None])
+            elif over_since is not None:
+                episodes[-1][2] = t
+                over_since = None
+            t += interval
+        rs.close()
+
+    # reazione: dall'inizio del sovraccarico reale alla prima decisione di scale-up
+    ups = [e[0] for e in events if e[1] == "up"]
+    for ep in episodes:
+        ep[1] = next((u for u in ups if u >= ep[0] - interval), None)
+    reactions = [ep[1] - ep[0] for ep in episodes if ep[1] is not None]
+    recoveries = [(ep[2] if ep[2] is not None else duration) - ep[0] for ep in episodes]
+    flaps = sum(1 for a, b in zip(events, events[1:]) if a[1] != b[1] and b[0] - a[0] <= flap_window)
+    return {
+        "policy": ctrl_args.policy + ("" if ctrl_args.predictive == "off" else f"+{ctrl_args.predictive}"),
+        "duration_s": duration,
+        "ticks": stats["ticks"],
+        "overload_episodes": len(episodes),
+        "missed_episodes": sum(1 for ep in episodes if ep[1] is None),
+        "reaction_mean_s": sum(reactions) / len(reactions) if reactions else None,
+        "reaction_max_s": max(reactions) if reactions else None,
+        "recovery_mean_s": sum(recoveries) / len(recoveries) if recoveries else None,
+        "time_over_threshold_s": stats["time_over"],
+        "replica_seconds": stats["replica_seconds"],
+        "max_replicas": stats["max_replicas"],
+        "scale_ups": sum(1 for e in events if e[1] == "up"),
+        "scale_downs": sum(1 for e in events if e[1] == "down"),
+        "flaps": flaps,
+        "api_calls": conn.cloud.calls,
+        "loop_errors": int(sum(rs.metrics.tick_errors.values.values())),
+    }
+
+def _fmt(v):
+    if v is None:
+        return "-"
+    return f"{v:.1f}" if isinstance(v, float) else str(v)
+
+def print_report(reports):
+    cols = ["policy", "reaction_mean_s", "reaction_max_s", "time_over_threshold_s", "recovery_mean_s",
+            "replica_seconds", "flaps", "scale_ups", "scale_downs", "missed_episodes", "max_replicas"]
+    widths = [max(len(c), *(len(_fmt(r[c])) for r in reports)) for c in cols]
+    print("  ".join(c.ljust(w) for c, w in zip(cols, widths)))
+    for r in reports:
+        print("  ".join(_fmt(r[c]).ljust(w) for c, w in zip(cols, widths)))
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    src = ap.add_mutually_exclusive_group()
+    src.add_argument("--profile", default="step:40,260,600,3600",
+                     help="Carico sintetico (domanda in %% di una VM): constant:V | step:LOW,HIGH,T0,T1 | "
+                          "ramp:FROM,TO,T0,T1 | sine:MEAN,AMP,PERIOD | burst:BASE,PEAK,EVERY,LEN")
+    src.add_argument("--trace", help="CSV t,demand registrato (ripetuto in loop fino a --duration)")
+    ap.add_argument("--duration", type=float, default=None,
+                    help="Secondi simulati (default: 2h, oppure la durata della trace)")
+    ap.add_argument("--noise", type=float, default=2.0, help="Rumore gaussiano (dev. std, punti %%) sui campioni")
+    ap.add_argument("--mem", type=float, default=10.0,
+                    help="RAM usata (%%) riportata da ogni replica: con --metric max fa da pavimento")
+    ap.add_argument("--boot-latency", type=float, default=60.0, help="Secondi BUILD -> ACTIVE")
+    ap.add_argument("--boot-jitter", type=float, default=10.0, help="Variazione uniforme ± sulla latenza di boot")
+    ap.add_argument("--port-latency", type=float, default=5.0, help="Secondi prima che il port Neutron esista")
+    ap.add_argument("--delete-latency", type=float, default=5.0, help="Secondi prima che una VM sparisca")
+    ap.add_argument("--snapshot-latency", type=float, default=30.0, help="Secondi per uno snapshot ACTIVE")
+    ap.add_argument("--fail-rate", type=float, default=0.0, help="Probabilità che un boot finisca in ERROR")
+    ap.add_argument("--flap-window", type=float, default=600.0,
+                    help="Un cambio di direzione entro questi secondi conta come flap")
+    ap.add_argument("--compare", help="Lista di policy da confrontare sullo stesso scenario (es. hits,ewma,percentile)")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--json", help="Scrive i report anche in questo file JSON")
+    ap.add_argument("--verbose", action="store_true", help="Mostra i log del controller")
+    args, rest = ap.parse_known_args()
+
+    ctrl = aw.build_parser().parse_args(["--clone", "sim", "--server", "sim-vm"] + rest)
+    if args.trace:
+        demand, span = load_trace(args.trace)
+        duration = args.duration or span
+    else:
+        demand = parse_profile(args.profile)
+        duration = args.duration or 7200.0
+    latencies = dict(boot_latency=args.boot_latency, boot_jitter=args.boot_jitter, port_latency=args.port_latency,
+                     delete_latency=args.delete_latency, snapshot_latency=args.snapshot_latency,
+                     fail_rate=args.fail_rate)
+
+    policies = args.compare.split(",") if args.compare else [ctrl.policy]
+    reports = []
+    for pol in policies:
+        ctrl.policy = pol.strip()
+        t0 = time.monotonic()
+        rep = run_scenario(ctrl, demand, duration, latencies, noise=args.noise, mem=args.mem, seed=args.seed,
+                           flap_window=args.flap_window, quiet=not args.verbose)
+        rep["wall_s"] = time.monotonic() - t0
+        reports.append(rep)
+        print(f"[i] {rep['policy']}: {duration:.0f}s simulati in {rep['wall_s']:.1f}s "
+              f"({rep['ticks']} tick, {rep['api_calls']} chiamate API finte)", file=sys.stderr)
+    print_report(reports)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(reports, f, indent=2)
+
+if __name__ == "__main__":
+    main()